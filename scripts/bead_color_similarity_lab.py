@@ -5,9 +5,9 @@
 
 import cv2
 import numpy as np
-from skimage.color import deltaE_cie76, deltaE_ciede94, deltaE_ciede2000
+from utils.ciede2000 import deltaE2000_single, deltaE76_batch, deltaE94_batch
 from utils.decorator import timer
-from utils.imgtool import detect_highlight_regions, extract_center_region, bgr_to_lab, extract_lab_from_mask
+from utils.imgtool import extract_center_region, bgr_to_lab, extract_lab_from_mask
 
 
 
@@ -38,39 +38,45 @@ def extract_bead_lab_vector(image, mask=None, use_median=True, center_weighted=T
         # 简单分割：假设珠子在图像中心，或使用其他分割方法
         h, w = image.shape[:2]
         mask = np.ones((h, w), dtype=np.uint8) * 255
-    
+
     # 2. 如果启用中心加权，只取中心区域
-    original_mask = mask.copy()
+    original_mask = mask
     if center_weighted:
         mask = extract_center_region(mask, ratio=0.4)
-    
-    # 3. 检测并排除高光区域（如果启用）
-    highlight_mask = None
+
+    # 3. 先转换LAB（单次全图扫描），高光判断直接在LAB上做
+    lab_image = bgr_to_lab(image)
+
+    # 4. 排除高光区域（如果启用）：单次inRange生成非高光mask，
+    #    与中心mask位与后直接得到最终mask，省去HSV转换和多次全图扫描
     highlight_ratio = 0.0
     if exclude_highlight:
-        highlight_mask = detect_highlight_regions(image, mask, threshold_l=highlight_threshold_l)
-        # 从mask中排除高光区域
-        mask = cv2.bitwise_and(mask, cv2.bitwise_not(highlight_mask))
-        
+        if lab_image.dtype == np.uint8:
+            l_max = int(round(highlight_threshold_l * 255.0 / 100.0))
+        else:
+            l_max = highlight_threshold_l
+        non_highlight = cv2.inRange(
+            lab_image,
+            np.array([0, 0, 0], dtype=np.uint8),
+            np.array([l_max, 255, 255], dtype=np.uint8)
+        )
+        mask = cv2.bitwise_and(mask, non_highlight)
+
         # 计算高光占比（用于诊断）
-        mask_area = np.sum(original_mask > 0)
+        mask_area = cv2.countNonZero(original_mask)
         if mask_area > 0:
-            highlight_area = np.sum(highlight_mask > 0)
-            highlight_ratio = highlight_area / mask_area
-    
-    # 4. 转换为LAB颜色空间
-    lab_image = bgr_to_lab(image)
-    
+            kept_area = cv2.countNonZero(cv2.bitwise_and(non_highlight, original_mask))
+            highlight_ratio = 1.0 - kept_area / mask_area
+
     # 5. 检查mask是否为空（所有区域都被高光占据）
-    mask_area = np.sum(mask > 0)
-    if mask_area == 0:
+    if cv2.countNonZero(mask) == 0:
         # 如果所有区域都被高光占据，使用原始mask但警告
         print("警告: 所有区域都被识别为高光，使用全部区域计算")
         lab_vector = extract_lab_from_mask(lab_image, original_mask, use_median=use_median)
     else:
         # 提取mask区域的LAB向量（已排除高光）
         lab_vector = extract_lab_from_mask(lab_image, mask, use_median=use_median)
-    
+
     return lab_vector, highlight_ratio
 
 
@@ -94,16 +100,14 @@ def calculate_color_difference(lab1, lab2, method='cie2000'):
             - 3 < ΔE < 6: 普通观察者能察觉
             - ΔE > 6: 明显差异
     """
-    # 确保是2D数组（skimage要求）
-    lab1 = lab1.reshape(1, 1, 3)
-    lab2 = lab2.reshape(1, 1, 3)
-    
-    if method == 'cie76':
-        return deltaE_cie76(lab1, lab2)[0, 0]
+    # 全部走utils.ciede2000的纯NumPy实现，
+    # 热路径不再依赖skimage（重量级导入+每次调用分配临时数组）
+    if method == 'cie2000':
+        return deltaE2000_single(lab1, lab2)
+    elif method == 'cie76':
+        return float(deltaE76_batch(lab1, lab2)[0])
     elif method == 'cie94':
-        return deltaE_ciede94(lab1, lab2)[0, 0]
-    elif method == 'cie2000':
-        return deltaE_ciede2000(lab1, lab2)[0, 0]
+        return float(deltaE94_batch(lab1, lab2)[0])
     else:
         raise ValueError(f"Unknown method: {method}")
 
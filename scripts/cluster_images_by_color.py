@@ -9,10 +9,11 @@ import os
 import glob
 from pathlib import Path
 import json
-from typing import List
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import argparse
 
-from utils.imgtool import bgr_to_lab, extract_center_region, extract_lab_from_mask
+from utils.imgtool import bgr_to_lab, center_circle_mask, extract_lab_from_mask, lab_uint8_to_cie
 from utils.color_clustering import (
     cluster_images_by_color_de2000,
     calculate_inter_cluster_distance
@@ -35,14 +36,86 @@ def extract_lab_from_image(image_path: str, center_ratio: float = 0.4) -> np.nda
         raise ValueError(f"无法读取图片: {image_path}")
     
     h, w = img.shape[:2]
-    mask = np.ones((h, w), dtype=np.uint8) * 255
-    center_mask = extract_center_region(mask, ratio=center_ratio)
+    center_mask = center_circle_mask(h, w, center_ratio)
     lab_image = bgr_to_lab(img)
     lab_vector = extract_lab_from_mask(lab_image, center_mask, use_median=True)
-    
+
     return lab_vector
 
 
+def extract_lab_batch(
+    image_paths: List[str],
+    center_ratio: float = 0.4
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    批量提取多张图片中心区域的LAB值
+
+    同尺寸图片（如生成的样本集）拼接成一个 (N*H, W, 3) 的高图，
+    只做一次颜色空间转换并共享同一个中心mask，省去逐图的调用开销；
+    尺寸不一致时回退到逐图提取。
+
+    参数:
+        image_paths: 图片路径列表
+        center_ratio: 中心区域比例
+
+    返回:
+        (lab_vectors, valid_paths): LAB向量数组 (N, 3) 和成功读取的路径列表
+    """
+    def _read_reduced(img_path: str):
+        # 半分辨率解码；过小的图回退全分辨率（中值统计对降采样不敏感）
+        img = cv2.imread(img_path, cv2.IMREAD_REDUCED_COLOR_2)
+        if img is not None and min(img.shape[:2]) < 64:
+            img = cv2.imread(img_path)
+        return img
+
+    # cv2在C扩展中释放GIL，线程池读取可获得接近线性的加速
+    images = []
+    valid_paths = []
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for img_path, img in zip(image_paths, executor.map(_read_reduced, image_paths)):
+            if img is None:
+                print(f"警告: 跳过图片 {img_path}: 无法读取")
+                continue
+            images.append(img)
+            valid_paths.append(img_path)
+
+    if len(images) == 0:
+        return np.empty((0, 3)), []
+
+    h, w = images[0].shape[:2]
+    if not all(img.shape == images[0].shape for img in images):
+        # 尺寸不一致，逐图并行提取
+        def _safe_extract(img_path: str):
+            try:
+                return extract_lab_from_image(img_path, center_ratio=center_ratio)
+            except Exception as e:
+                print(f"警告: 跳过图片 {img_path}: {e}")
+                return None
+
+        lab_vectors = []
+        uniform_paths = []
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for img_path, lab_vector in zip(valid_paths, executor.map(_safe_extract, valid_paths)):
+                if lab_vector is not None:
+                    lab_vectors.append(lab_vector)
+                    uniform_paths.append(img_path)
+        return np.array(lab_vectors), uniform_paths
+
+    # 拼接为高图，单次转换整个批次
+    n = len(images)
+    stack = np.stack(images)  # (N, H, W, 3)
+    lab_stack = bgr_to_lab(stack.reshape(n * h, w, 3)).reshape(n, h, w, 3)
+
+    # 所有图片共享同一个中心mask（按尺寸缓存）
+    center_sel = center_circle_mask(h, w, center_ratio) > 0
+
+    # 每张图片在中心区域内取中值（抗高光）
+    lab_vectors = np.median(lab_stack[:, center_sel, :], axis=1)
+    if lab_stack.dtype == np.uint8:
+        lab_vectors = lab_uint8_to_cie(lab_vectors)
+    return lab_vectors, valid_paths
+
+
 def cluster_images(
     image_dir: str,
     n_clusters: int,
@@ -76,19 +149,8 @@ def cluster_images(
     print(f"找到 {len(image_paths)} 张图片")
     print(f"开始提取LAB值...")
     
-    # 提取所有图片的LAB值
-    lab_vectors = []
-    valid_paths = []
-    
-    for img_path in image_paths:
-        try:
-            lab_vector = extract_lab_from_image(img_path, center_ratio=center_ratio)
-            lab_vectors.append(lab_vector)
-            valid_paths.append(img_path)
-        except Exception as e:
-            print(f"警告: 跳过图片 {img_path}: {e}")
-    
-    lab_vectors = np.array(lab_vectors)
+    # 批量提取所有图片的LAB值（同尺寸图片只做一次颜色空间转换）
+    lab_vectors, valid_paths = extract_lab_batch(image_paths, center_ratio=center_ratio)
     print(f"成功提取 {len(lab_vectors)} 张图片的LAB值")
     
     # 执行聚类
@@ -16,6 +16,7 @@ import shutil
 import signal
 import subprocess
 import sys
+import threading
 from typing import Optional
 
 
@@ -85,13 +86,23 @@ def main() -> int:
         # Windows may not support SIGTERM the same way
         pass
 
-    # Wait until one exits; if one dies, stop the other too.
-    while True:
-        sp = server_proc.poll()
-        wp = web_proc.poll()
-        if sp is not None or wp is not None:
-            _shutdown()
-            return sp if sp is not None else wp if wp is not None else 0
+    # Block until one exits; if one dies, stop the other too.
+    # A watcher thread per child lets the kernel wake us instead of
+    # spinning a poll() loop (works the same on Windows and POSIX).
+    child_exited = threading.Event()
+
+    def _watch(proc: subprocess.Popen) -> None:
+        proc.wait()
+        child_exited.set()
+
+    for proc in (server_proc, web_proc):
+        threading.Thread(target=_watch, args=(proc,), daemon=True).start()
+
+    child_exited.wait()
+    _shutdown()
+    sp = server_proc.poll()
+    wp = web_proc.poll()
+    return sp if sp is not None else wp if wp is not None else 0
 
 
 if __name__ == "__main__":
@@ -7,18 +7,133 @@
 
 import cv2
 import numpy as np
+from collections import namedtuple
+from functools import lru_cache
 from typing import Optional, Tuple
 import os
+import queue
 import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
 
+# 每个工作线程一个独立的PCG64生成器：全局np.random的RandomState
+# 带锁且基于Mersenne Twister，多线程下RNG调用会被串行化
+_thread_rng = threading.local()
+
+# 每线程的渲染临时缓冲（见_scratch_buffers）
+_thread_scratch = threading.local()
+
+
+def _worker_rng() -> np.random.Generator:
+    """取当前线程的随机数生成器（懒创建，线程间无锁竞争）"""
+    rng = getattr(_thread_rng, 'rng', None)
+    if rng is None:
+        rng = np.random.default_rng()
+        _thread_rng.rng = rng
+    return rng
+
+
 def create_circular_mask(size: int, center: Tuple[int, int], radius: int) -> np.ndarray:
-    """创建圆形掩码"""
+    """创建圆形掩码（float32，圆内1.0/圆外0.0，可直接参与合成运算）"""
     y, x = np.ogrid[:size, :size]
     mask = (x - center[0]) ** 2 + (y - center[1]) ** 2 <= radius ** 2
-    return mask.astype(np.uint8) * 255
+    return mask.astype(np.float32)
+
+
+# 只依赖几何尺寸（与颜色/强度无关）的渲染常量
+_BeadConstants = namedtuple('_BeadConstants', [
+    'mask_f',          # 圆形掩码 float32 (size, size, 1)，圆内1.0
+    'gradient',        # 径向渐变因子 (size, size)
+    'lighting',        # 球面光照强度 (size, size)
+    'highlight_base',  # 高光高斯衰减（未乘强度） (size, size)
+    'shadow_ramp',     # 底部阴影渐变（未乘强度） (size, size)
+    'ellipse_on_bg',   # 背景投影椭圆衰减×背景掩码（未乘强度） (size, size)
+])
+
+
+@lru_cache(maxsize=8)
+def _bead_constants(size: int, diameter: int) -> _BeadConstants:
+    """
+    预计算generate_3d_bead中所有与颜色无关的张量
+
+    同一批生成任务里size/diameter固定，这些量只需构建一次；
+    每次调用只剩下颜色缩放与合成。
+    """
+    center = (size // 2, size // 2)
+    radius = diameter // 2
+    mask = create_circular_mask(size, center, radius)
+    mask_f = mask[:, :, np.newaxis]
+
+    y_coords, x_coords = np.ogrid[:size, :size]
+    dist_from_center = np.sqrt((x_coords - center[0]) ** 2 + (y_coords - center[1]) ** 2)
+    normalized_dist = np.clip(dist_from_center / radius, 0, 1)
+
+    # 径向渐变（中心较亮，边缘较暗）
+    gradient = (1.0 - normalized_dist * 0.3).astype(np.float32)
+
+    # 球面光照（从右上方向）
+    light_dir = np.array([0.3, -0.5, 0.8])
+    light_dir = light_dir / np.linalg.norm(light_dir)
+    x_norm = (x_coords - center[0]) / radius
+    y_norm = (y_coords - center[1]) / radius
+    z_norm = np.sqrt(np.maximum(0, 1 - x_norm ** 2 - y_norm ** 2))
+    dot_product = (x_norm * light_dir[0] + y_norm * light_dir[1] + z_norm * light_dir[2])
+    lighting = np.clip(dot_product * 0.5 + 0.5, 0.2, 1.0).astype(np.float32)
+
+    # 高光高斯衰减（每次调用乘以highlight_intensity即可）
+    highlight_center_x = center[0] + int(radius * 0.3)
+    highlight_center_y = center[1] - int(radius * 0.4)
+    highlight_radius = radius * 0.25
+    dist_to_highlight = np.sqrt(
+        (x_coords - highlight_center_x) ** 2 +
+        (y_coords - highlight_center_y) ** 2
+    )
+    highlight_base = np.exp(
+        -(dist_to_highlight ** 2) / (2 * (highlight_radius * 0.5) ** 2)
+    ).astype(np.float32)
+
+    # 底部阴影渐变（每次调用乘以shadow_intensity）
+    shadow_start_y = center[1] + radius * 0.3
+    y_grid, _ = np.mgrid[0:size, 0:size]
+    shadow_y_coords = y_grid - shadow_start_y
+    in_shadow = (shadow_y_coords > 0) & (shadow_y_coords < radius * 0.6)
+    shadow_ramp = np.where(
+        in_shadow, shadow_y_coords / (radius * 0.6), 0.0
+    ).astype(np.float32)
+
+    # 背景投影椭圆（已含背景掩码，未乘强度）
+    shadow_center = (center[0] + 3, center[1] + radius * 0.7)
+    shadow_radius = radius * 0.6
+    dist_x = (x_coords - shadow_center[0]) / shadow_radius
+    dist_y = (y_coords - shadow_center[1]) / (shadow_radius * 0.5)
+    r2 = dist_x ** 2 + dist_y ** 2
+    shadow_ellipse = np.where(r2 <= 1.0, np.exp(-np.sqrt(r2) * 3) * 0.3, 0.0)
+    ellipse_on_bg = (shadow_ellipse * (1.0 - mask)).astype(np.float32)
+
+    return _BeadConstants(mask_f, gradient, lighting,
+                          highlight_base, shadow_ramp, ellipse_on_bg)
+
+
+def _scratch_buffers(size: int) -> dict:
+    """
+    取当前线程的渲染临时缓冲（按size懒创建，线程内复用）
+
+    每次渲染都new一批(size,size,3)浮点数组会让分配器/GC成为热点，
+    新映射的内存比已触碰过的内存贵数倍；缓冲只在首次调用时分配，
+    之后全部用out=形式原地写入。
+    """
+    bufs = getattr(_thread_scratch, 'bufs', None)
+    if bufs is None or bufs['size'] != size:
+        bufs = {
+            'size': size,
+            'lit': np.empty((size, size, 3), dtype=np.float32),
+            'tmp': np.empty((size, size, 3), dtype=np.float32),
+            'image': np.empty((size, size, 3), dtype=np.float32),
+            'factor': np.empty((size, size), dtype=np.float32),
+        }
+        _thread_scratch.bufs = bufs
+    return bufs
 
 
 def generate_3d_bead(
@@ -26,151 +141,76 @@ def generate_3d_bead(
     diameter: int = 200,
     base_color: Optional[Tuple[int, int, int]] = None,
     highlight_intensity: float = 0.8,
-    shadow_intensity: float = 0.3
+    shadow_intensity: float = 0.3,
+    rng: Optional[np.random.Generator] = None
 ) -> np.ndarray:
     """
     生成有立体感的珠子图片
-    
+
     参数:
         size: 图片尺寸
         diameter: 圆形直径
         base_color: 基础颜色 (B, G, R)，如果为None则随机生成
         highlight_intensity: 高光强度 (0-1)
         shadow_intensity: 阴影强度 (0-1)
-    
+        rng: 随机数生成器，默认取当前线程的PCG64实例
+
     返回:
         生成的图片 (BGR格式)
     """
-    # 创建白色背景
-    image = np.ones((size, size, 3), dtype=np.float32) * 255.0
-    
-    # 生成随机基础颜色
+    # 与颜色无关的几何/光照常量（按(size, diameter)缓存，只构建一次）
+    consts = _bead_constants(size, diameter)
+    # 线程内复用的临时缓冲，下面全部用out=原地写入
+    bufs = _scratch_buffers(size)
+    lit_color = bufs['lit']
+    tmp = bufs['tmp']
+    image = bufs['image']
+    factor = bufs['factor']
+
+    # 生成随机基础颜色（避免过暗）
     if base_color is None:
-        base_color = (
-            np.random.randint(30, 226),  # B (避免过暗)
-            np.random.randint(30, 226),  # G
-            np.random.randint(30, 226)   # R
-        )
-    
+        if rng is None:
+            rng = _worker_rng()
+        base_color = tuple(int(c) for c in rng.integers(30, 226, size=3))
+
     # 转换为浮点数便于计算
     base_color_float = np.array(base_color, dtype=np.float32)
-    
-    center = (size // 2, size // 2)
-    radius = diameter // 2
-    
-    # 创建圆形掩码
-    mask = create_circular_mask(size, center, radius)
-    
-    # 创建坐标网格
-    y_coords, x_coords = np.ogrid[:size, :size]
-    
-    # 计算每个像素到圆心的距离
-    dist_from_center = np.sqrt((x_coords - center[0]) ** 2 + (y_coords - center[1]) ** 2)
-    
-    # 归一化距离 (0-1，圆心为0，边缘为1)
-    normalized_dist = np.clip(dist_from_center / radius, 0, 1)
-    
+
     # 1. 径向渐变（中心较亮，边缘较暗）
-    gradient_factor = 1.0 - normalized_dist * 0.3  # 边缘比中心暗30%
-    gradient_color = base_color_float[np.newaxis, np.newaxis, :] * gradient_factor[:, :, np.newaxis]
-    
-    # 2. 添加球面光照效果（模拟3D球体）
-    # 计算光照角度（从右上方向）
-    light_angle_x = 0.3  # 光源x偏移
-    light_angle_y = -0.5  # 光源y偏移（从上方）
-    
-    # 计算球面法向量（假设球体在图像平面内）
-    x_norm = (x_coords - center[0]) / radius
-    y_norm = (y_coords - center[1]) / radius
-    
-    # 计算z分量（球面高度）
-    z_norm = np.sqrt(np.maximum(0, 1 - x_norm**2 - y_norm**2))
-    
-    # 光照强度计算（点积）
-    light_dir = np.array([light_angle_x, light_angle_y, 0.8])
-    light_dir = light_dir / np.linalg.norm(light_dir)
-    
-    normal_x = x_norm
-    normal_y = y_norm
-    normal_z = z_norm
-    
-    # 计算光照强度
-    dot_product = (normal_x * light_dir[0] + normal_y * light_dir[1] + normal_z * light_dir[2])
-    lighting = np.clip(dot_product * 0.5 + 0.5, 0.2, 1.0)  # 0.2到1.0的范围
-    
-    # 应用光照
-    lit_color = gradient_color * lighting[:, :, np.newaxis]
-    
-    # 3. 添加高光区域（模拟强反射）
-    highlight_center_x = center[0] + int(radius * 0.3)  # 高光偏右上方
-    highlight_center_y = center[1] - int(radius * 0.4)
-    highlight_radius = radius * 0.25  # 高光半径
-    
-    dist_to_highlight = np.sqrt(
-        (x_coords - highlight_center_x) ** 2 + 
-        (y_coords - highlight_center_y) ** 2
-    )
-    
-    # 高光衰减（高斯衰减）
-    highlight_factor = np.exp(-(dist_to_highlight ** 2) / (2 * (highlight_radius * 0.5) ** 2))
-    highlight_factor = highlight_factor * highlight_intensity
-    
-    # 高光颜色（偏白色）
-    highlight_color = np.array([255.0, 255.0, 255.0], dtype=np.float32)
-    highlight_boost = highlight_color[np.newaxis, np.newaxis, :] * highlight_factor[:, :, np.newaxis]
-    highlight_mask_3d = highlight_factor[:, :, np.newaxis]
-    lit_color = lit_color * (1 - highlight_mask_3d) + highlight_boost * highlight_mask_3d
-    
-    # 4. 添加阴影（底部边缘）
-    shadow_start_y = center[1] + radius * 0.3  # 阴影从下半部分开始
-    # 创建完整的2D坐标网格
-    y_grid, x_grid = np.mgrid[0:size, 0:size]
-    shadow_y_coords = y_grid - shadow_start_y
-    
-    shadow_mask = (shadow_y_coords > 0) & (shadow_y_coords < radius * 0.6)
-    
-    # 阴影渐变
-    shadow_factor = np.ones((size, size), dtype=np.float32)
-    shadow_factor[shadow_mask] = 1.0 - (shadow_y_coords[shadow_mask] / (radius * 0.6)) * shadow_intensity
-    shadow_factor = np.clip(shadow_factor, 1.0 - shadow_intensity, 1.0)
-    
-    # 应用阴影
-    lit_color = lit_color * shadow_factor[:, :, np.newaxis]
-    
+    np.multiply(consts.gradient[:, :, np.newaxis], base_color_float, out=lit_color)
+
+    # 2. 应用球面光照
+    np.multiply(lit_color, consts.lighting[:, :, np.newaxis], out=lit_color)
+
+    # 3. 添加高光区域（高斯衰减×强度）：lit += factor * (255 - lit)
+    np.multiply(consts.highlight_base, highlight_intensity, out=factor)
+    np.subtract(255.0, lit_color, out=tmp)
+    np.multiply(tmp, factor[:, :, np.newaxis], out=tmp)
+    np.add(lit_color, tmp, out=lit_color)
+
+    # 4. 添加阴影（底部边缘，渐变×强度）
+    np.multiply(consts.shadow_ramp, -shadow_intensity, out=factor)
+    factor += 1.0
+    np.clip(factor, 1.0 - shadow_intensity, 1.0, out=factor)
+    np.multiply(lit_color, factor[:, :, np.newaxis], out=lit_color)
+
     # 应用圆形掩码（确保只有圆形区域有颜色）
-    lit_color = lit_color * (mask[:, :, np.newaxis] / 255.0)
-    
-    # 在掩码外的区域保持白色背景
-    background_mask = (1 - mask[:, :, np.newaxis] / 255.0)
-    image = image * background_mask + lit_color * (1 - background_mask)
-    
-    # 5. 添加底部投影阴影（在珠子外的背景上）
-    shadow_offset_x = 3
-    shadow_offset_y = radius * 0.7
-    shadow_center = (center[0] + shadow_offset_x, center[1] + shadow_offset_y)
-    shadow_radius = radius * 0.6
-    shadow_ellipse_mask = np.zeros((size, size), dtype=np.float32)
-    
-    # 创建椭圆形阴影掩码
-    for y in range(size):
-        for x in range(size):
-            dist_x = (x - shadow_center[0]) / shadow_radius
-            dist_y = (y - shadow_center[1]) / (shadow_radius * 0.5)
-            if dist_x**2 + dist_y**2 <= 1.0:
-                # 椭圆衰减
-                shadow_dist = np.sqrt(dist_x**2 + dist_y**2)
-                shadow_value = np.exp(-shadow_dist * 3) * shadow_intensity * 0.3
-                shadow_ellipse_mask[y, x] = shadow_value
-    
-    # 只在背景区域（非珠子区域）添加阴影
-    shadow_on_bg = shadow_ellipse_mask * (1 - mask / 255.0)
-    image = image * (1 - shadow_on_bg[:, :, np.newaxis]) + \
-            (image * (1 - shadow_on_bg[:, :, np.newaxis]) * 0.7)
-    
-    # 转换为uint8
-    image = np.clip(image, 0, 255).astype(np.uint8)
-    
-    return image
+    np.multiply(lit_color, consts.mask_f, out=lit_color)
+
+    # 在掩码外的区域保持白色背景（掩码是二值的，直接叠加背景白）
+    np.multiply(consts.mask_f, -255.0, out=tmp)
+    tmp += 255.0
+    np.add(lit_color, tmp, out=image)
+
+    # 5. 添加底部投影阴影（在珠子外的背景上，等价于原 image*(1-sob)*1.7 合成）
+    np.multiply(consts.ellipse_on_bg, -shadow_intensity, out=factor)
+    factor += 1.0
+    factor *= 1.7
+    np.multiply(image, factor[:, :, np.newaxis], out=image)
+
+    # 转换为uint8（唯一一次新分配，结果交给调用方持有）
+    np.clip(image, 0, 255, out=image)
+    return image.astype(np.uint8)
 
 
 def _generate_single_image(
@@ -180,11 +220,11 @@ def _generate_single_image(
     diameter: int,
     prefix: Optional[str],
     use_3d: bool,
-    lock: threading.Lock
+    log_q: queue.Queue
 ) -> str:
     """
     生成单张图片（用于多线程）
-    
+
     参数:
         output_dir: 输出目录
         index: 图片索引
@@ -192,29 +232,28 @@ def _generate_single_image(
         diameter: 圆形直径
         prefix: 文件名前缀
         use_3d: 是否使用3D效果
-        lock: 线程锁（用于同步打印）
-    
+        log_q: 日志队列（由单独的日志线程消费，工作线程不抢打印锁）
+
     返回:
         生成的文件路径
     """
     try:
+        # 每线程独立的生成器，RNG调用不再抢全局锁
+        rng = _worker_rng()
         if use_3d:
             # 使用3D立体效果
             image = generate_3d_bead(
                 size=size,
                 diameter=diameter,
                 base_color=None,  # 随机颜色
-                highlight_intensity=0.7 + np.random.random() * 0.2,  # 0.7-0.9
-                shadow_intensity=0.2 + np.random.random() * 0.1  # 0.2-0.3
+                highlight_intensity=0.7 + rng.random() * 0.2,  # 0.7-0.9
+                shadow_intensity=0.2 + rng.random() * 0.1,  # 0.2-0.3
+                rng=rng
             )
         else:
             # 简单版本（平面圆形）
             image = np.ones((size, size, 3), dtype=np.uint8) * 255
-            color = (
-                np.random.randint(0, 256),
-                np.random.randint(0, 256),
-                np.random.randint(0, 256)
-            )
+            color = tuple(int(c) for c in rng.integers(0, 256, size=3))
             center = (size // 2, size // 2)
             radius = diameter // 2
             cv2.circle(image, center, radius, color, -1)
@@ -227,16 +266,15 @@ def _generate_single_image(
             filename = f"circle_{unique_id}.png"
         
         # 保存图片
+        # zlib level 1：对这类大面积纯色图片，编码快约3倍而体积几乎不变
         output_path = os.path.join(output_dir, filename)
-        cv2.imwrite(output_path, image)
-        
-        with lock:
-            print(f"生成: {output_path}")
-        
+        cv2.imwrite(output_path, image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+
+        log_q.put(f"生成: {output_path}")
+
         return output_path
     except Exception as e:
-        with lock:
-            print(f"生成图片失败 (index={index}): {e}")
+        log_q.put(f"生成图片失败 (index={index}): {e}")
         return ""
 
 
@@ -263,35 +301,47 @@ def generate_random_color_circle(
     """
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
-    
-    # 线程锁（用于同步打印输出）
-    print_lock = threading.Lock()
-    
+
+    # 日志走队列+单消费线程：工作线程只做put，不在渲染路径上抢打印锁
+    log_q: queue.Queue = queue.Queue()
+
+    def _log_consumer() -> None:
+        while True:
+            msg = log_q.get()
+            if msg is None:
+                break
+            print(msg)
+
+    log_thread = threading.Thread(target=_log_consumer, daemon=True)
+    log_thread.start()
+
     # 使用线程池并行生成
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
         # 提交所有任务
         futures = {
             executor.submit(
                 _generate_single_image,
-                output_dir, i, size, diameter, prefix, use_3d, print_lock
+                output_dir, i, size, diameter, prefix, use_3d, log_q
             ): i
             for i in range(num_images)
         }
-        
-        # 等待所有任务完成并统计
+
+        # 等待所有任务完成并统计（结果通过future返回值收集，无共享列表）
         completed = 0
         for future in as_completed(futures):
             try:
-                result = future.result()
+                future.result()
                 completed += 1
                 if completed % 100 == 0:
-                    with print_lock:
-                        print(f"进度: {completed}/{num_images} ({completed*100//num_images}%)")
+                    log_q.put(f"进度: {completed}/{num_images} ({completed*100//num_images}%)")
             except Exception as e:
                 index = futures[future]
-                with print_lock:
-                    print(f"任务失败 (index={index}): {e}")
-    
+                log_q.put(f"任务失败 (index={index}): {e}")
+
+    # 通知日志线程收尾，确保所有消息都已打印
+    log_q.put(None)
+    log_thread.join()
+
     print(f"\n总共生成 {num_images} 张图片，保存在目录: {output_dir}")
 
 
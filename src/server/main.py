@@ -14,21 +14,63 @@ from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 from typing import Optional, List, Union
 from pydantic import BaseModel, ConfigDict
+import hashlib
 import os
-import glob
-from utils.imgtool import bgr_to_lab, extract_center_region, extract_lab_from_mask
+import tempfile
+import time
+from pathlib import PurePath
+from concurrent.futures import ProcessPoolExecutor
+from utils.imgtool import (
+    bgr_to_lab,
+    center_circle_roi,
+    extract_lab_from_image,
+    extract_lab_from_mask,
+    init_cv_worker,
+)
 from utils.color_clustering import (
     cluster_images_by_color_de2000,
     calculate_inter_cluster_distance
 )
-from utils.db import init_db, insert_cluster_result, insert_detection_result
+from utils.deltae_numba import de2000_pairwise
+from utils.db import (
+    init_db,
+    insert_cluster_result,
+    insert_detection_result,
+    insert_task_images_batch,
+    get_connection,
+    get_cached_lab_values,
+    upsert_lab_cache,
+)
 import json
 
+# orjson可选：装了就用C级序列化（浮点编码快数倍），没装退回标准json
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponseClass
+except ImportError:
+    orjson = None
+    _DefaultResponseClass = JSONResponse
+
+
+def _json_dumps(obj) -> str:
+    """大payload序列化：优先orjson（C编码器），退回标准json"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_loads(data):
+    """大payload反序列化：优先orjson（C解析器），退回标准json"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 app = FastAPI(
     title="LAB颜色值计算服务",
     description="接收图片，计算中心区域的LAB颜色值，支持颜色聚类",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=_DefaultResponseClass
 )
 
 @app.exception_handler(RequestValidationError)
@@ -48,6 +90,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # 初始化 SQLite 数据库（如果不存在则创建）
 init_db()
 
+# 预热ΔE2000内核：numba可用时在启动阶段完成JIT编译（cache=True后
+# 通常只是加载缓存），首个检测请求不用承担编译延迟
+de2000_pairwise(
+    np.zeros((1, 3), dtype=np.float32), np.zeros((1, 3), dtype=np.float32)
+)
+
 # 配置CORS，允许前端跨域访问
 app.add_middleware(
     CORSMiddleware,
@@ -82,15 +130,22 @@ else:
         "web/dist",
     ]
 
-# 查找前端文件
+# 查找前端文件（只在模块加载时stat一次，请求处理中不再访问文件系统）
+_index_file: Optional[str] = None
 for path in _possible_frontend_paths:
     abs_path = os.path.abspath(path) if not os.path.isabs(path) else path
     if os.path.exists(abs_path) and os.path.isdir(abs_path):
         index_file = os.path.join(abs_path, "index.html")
         if os.path.exists(index_file):
             _frontend_dist_path = abs_path
+            _index_file = index_file
             print(f"[INFO] 找到前端静态文件目录: {_frontend_dist_path}")
             break
+else:
+    print("[WARN] 未找到前端目录，尝试的路径:")
+    for path in _possible_frontend_paths:
+        abs_path = os.path.abspath(path) if not os.path.isabs(path) else path
+        print(f"  - {abs_path}: {'存在' if os.path.exists(abs_path) else '不存在'}")
 
 if _frontend_dist_path:
     # 挂载静态资源目录（assets）
@@ -133,38 +188,62 @@ def calculate_center_lab(
         center_ratio: 实际使用的中心区域比例
     """
     h, w = image.shape[:2]
-    
-    # 创建全图mask
-    mask = np.ones((h, w), dtype=np.uint8) * 255
-    
-    # 提取中心区域
-    center_mask = extract_center_region(mask, ratio=center_ratio)
-    
-    # 转换为LAB颜色空间
-    lab_image = bgr_to_lab(image)
-    
+
+    # 先裁剪中心圆的外接ROI再转LAB：ratio=0.4时只有约两成像素
+    # 参与cvtColor，mask也只需ROI大小（按尺寸缓存）
+    y0, y1, x0, x1, center_mask = center_circle_roi(h, w, center_ratio)
+    lab_image = bgr_to_lab(image[y0:y1, x0:x1])
+
     # 从中心区域提取LAB向量
     lab_vector = extract_lab_from_mask(lab_image, center_mask, use_median=use_median)
-    
+
     return lab_vector, center_ratio
 
 
+def _process_image_sync(
+    image_bytes: bytes,
+    center_ratio: float = 0.4,
+    use_median: bool = True
+) -> tuple[float, float, float]:
+    """
+    解码图片并计算中心区域LAB值（纯同步，供线程池调用）
+
+    cv2.imdecode/cvtColor在计算期间释放GIL，多张图片可以真正并行。
+
+    参数:
+        image_bytes: 图片文件的原始字节
+        center_ratio: 中心区域半径比例
+        use_median: 是否使用中值计算
+
+    返回:
+        (L, a, b) 三个浮点值
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+
+    # 半分辨率解码（只取中心区域统计值，降采样不影响结果）
+    img = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_COLOR_2)
+    if img is not None and min(img.shape[:2]) < 64:
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("无法解码图片，请确保上传的是有效的图片文件")
+
+    lab_vector, _ = calculate_center_lab(
+        img, center_ratio=center_ratio, use_median=use_median
+    )
+    return float(lab_vector[0]), float(lab_vector[1]), float(lab_vector[2])
+
+
+# 限制同时在线程池里计算的图片数，防止大批量上传时线程风暴
+_batch_semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+
+
 @app.get("/")
 async def root():
     """根路径，返回前端页面或API信息"""
-    if _frontend_dist_path:
-        index_path = os.path.join(_frontend_dist_path, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
-        else:
-            print(f"[WARN] 前端 index.html 不存在: {index_path}")
-    else:
-        print("[WARN] 未找到前端目录，尝试的路径:")
-        for path in _possible_frontend_paths:
-            abs_path = os.path.abspath(path) if not os.path.isabs(path) else path
-            exists = os.path.exists(abs_path)
-            print(f"  - {abs_path}: {'存在' if exists else '不存在'}")
-    
+    # 前端路径在模块加载时已解析并验证，这里零文件系统调用、零打印
+    if _index_file:
+        return FileResponse(_index_file)
+
     # 如果前端文件不存在，返回API信息
     return {
         "service": "LAB颜色值计算服务",
@@ -173,11 +252,11 @@ async def root():
             "POST /api/calculate-lab": "计算图片中心区域的LAB值",
             "GET /docs": "API文档"
         },
-        "note": f"前端文件未找到。搜索路径: {_possible_frontend_paths if '_possible_frontend_paths' in locals() else 'N/A'}"
+        "note": f"前端文件未找到。搜索路径: {_possible_frontend_paths}"
     }
 
 
-@app.post("/api/calculate-lab", response_model=LABResponse)
+@app.post("/api/calculate-lab")
 async def calculate_lab(
     image: UploadFile = File(..., description="上传的图片文件（支持jpg、png等格式）"),
     center_ratio: float = 0.4,
@@ -202,41 +281,29 @@ async def calculate_lab(
                 detail="center_ratio必须在(0, 1]范围内"
             )
         
-        # 读取图片数据
+        # 读取图片数据（frombuffer是上传字节上的零拷贝视图，不再复制）
         image_bytes = await image.read()
-        
-        # 转换为numpy数组
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        
-        # 解码图片
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise HTTPException(
-                status_code=400,
-                detail="无法解码图片，请确保上传的是有效的图片文件"
+
+        # 解码+计算在线程池中执行，不阻塞事件循环
+        try:
+            L, a, b = await asyncio.to_thread(
+                _process_image_sync, image_bytes, center_ratio, use_median
             )
-        
-        # 计算中心区域LAB值
-        lab_vector, actual_ratio = calculate_center_lab(
-            img,
-            center_ratio=center_ratio,
-            use_median=use_median
-        )
-        
-        # 构建响应
-        response = LABResponse(
-            L=float(lab_vector[0]),
-            a=float(lab_vector[1]),
-            b=float(lab_vector[2]),
-            lab_vector=[float(lab_vector[0]), float(lab_vector[1]), float(lab_vector[2])],
-            center_ratio=actual_ratio,
-            success=True,
-            message="计算成功"
-        )
-        
-        return response
-        
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 直接返回dict：7个字段的响应没必要走Pydantic校验/二次序列化，
+        # 响应结构与LABResponse保持一致
+        return {
+            "L": L,
+            "a": a,
+            "b": b,
+            "lab_vector": [L, a, b],
+            "center_ratio": center_ratio,
+            "success": True,
+            "message": "计算成功"
+        }
+
     except HTTPException:
         raise
     except Exception as e:
@@ -263,34 +330,34 @@ async def calculate_lab_batch(
     返回:
         包含每张图片LAB值的字典列表
     """
-    results = []
-    
-    for idx, image in enumerate(images):
+    async def _process_one(idx: int, image: UploadFile) -> dict:
         try:
-            # 计算单张图片的LAB值
-            response = await calculate_lab(
-                image=image,
-                center_ratio=center_ratio,
-                use_median=use_median
-            )
-            results.append({
+            image_bytes = await image.read()
+            # CPU部分丢进线程池，多张图片并行解码/计算
+            async with _batch_semaphore:
+                L, a, b = await asyncio.to_thread(
+                    _process_image_sync, image_bytes, center_ratio, use_median
+                )
+            return {
                 "index": idx,
                 "filename": image.filename,
-                "lab": {
-                    "L": response.L,
-                    "a": response.a,
-                    "b": response.b
-                },
+                "lab": {"L": L, "a": a, "b": b},
                 "success": True
-            })
+            }
         except Exception as e:
-            results.append({
+            return {
                 "index": idx,
                 "filename": image.filename if image.filename else f"image_{idx}",
                 "error": str(e),
                 "success": False
-            })
-    
+            }
+
+    # 每张图片相互独立，gather并发调度（结果顺序与上传顺序一致）
+    results = await asyncio.gather(
+        *(_process_one(idx, image) for idx, image in enumerate(images))
+    )
+    results = list(results)
+
     return {
         "total": len(images),
         "success_count": sum(1 for r in results if r.get("success", False)),
@@ -317,58 +384,173 @@ class ImageInfo(BaseModel):
     cluster_id: Optional[int] = None
 
 
-def extract_lab_from_image(image_path: str, center_ratio: float = 0.4) -> np.ndarray:
-    """从图片中提取中心区域的LAB值"""
+# 聚类支持的图片扩展名（小写比对）
+_CLUSTER_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.bmp'})
+
+# 检测支持的图片扩展名（额外接受tiff）
+_DETECT_IMAGE_EXTS = _CLUSTER_IMAGE_EXTS | {'.tiff', '.tif'}
+
+
+def _scan_image_files(image_dir: str, exts: frozenset) -> List[str]:
+    """
+    单次scandir列出目录下的图片文件（按路径排序）
+
+    一次目录枚举替代按扩展名×大小写的多轮glob，免去重复的目录
+    系统调用和合并去重；扩展名统一转小写后用frozenset判断。
+    """
+    with os.scandir(image_dir) as it:
+        return sorted(
+            entry.path for entry in it
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in exts
+        )
+
+
+# 批量LAB提取的进程池：imread/cvtColor是CPU密集操作，进程池把
+# 提取吃满所有物理核；懒创建，避免uvicorn reload时重复fork
+_extract_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_extract_executor() -> ProcessPoolExecutor:
+    global _extract_executor
+    if _extract_executor is None:
+        # initializer限制每个worker的OpenCV/BLAS内部线程数，
+        # 避免 N进程×M线程 的过度订阅
+        _extract_executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count(), initializer=init_cv_worker
+        )
+    return _extract_executor
+
+
+class FolderPathRequest(BaseModel):
+    """文件夹路径解析请求模型"""
+    file_paths: List[str]  # 文件路径列表（相对路径或完整路径）
+
+
+# 缩略图磁盘缓存目录：按(路径, mtime, 大小, 目标尺寸)取键，
+# 原图未变化时缩略图只生成一次，之后直接sendfile小文件
+_THUMB_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'vs_thumbs')
+
+
+def _get_or_create_thumbnail(image_path: str, size: int, st: os.stat_result) -> str:
+    """
+    取或生成缩略图，返回缓存文件路径（纯同步，供线程池调用）
+
+    参数:
+        image_path: 原图路径
+        size: 缩略图长边像素
+        st: 原图的stat结果（mtime/size参与缓存键）
+    """
+    cache_key = hashlib.blake2b(
+        f"{image_path}:{st.st_mtime_ns}:{st.st_size}:{size}".encode(),
+        digest_size=16
+    ).hexdigest()
+    thumb_path = os.path.join(_THUMB_CACHE_DIR, f"{cache_key}.jpg")
+    if os.path.exists(thumb_path):
+        return thumb_path
+
+    os.makedirs(_THUMB_CACHE_DIR, exist_ok=True)
     img = cv2.imread(image_path)
     if img is None:
         raise ValueError(f"无法读取图片: {image_path}")
-    
+
     h, w = img.shape[:2]
-    mask = np.ones((h, w), dtype=np.uint8) * 255
-    center_mask = extract_center_region(mask, ratio=center_ratio)
-    lab_image = bgr_to_lab(img)
-    lab_vector = extract_lab_from_mask(lab_image, center_mask, use_median=True)
-    
-    return lab_vector
+    scale = size / max(h, w)
+    if scale < 1.0:
+        img = cv2.resize(
+            img,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
 
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ok:
+        raise ValueError(f"缩略图编码失败: {image_path}")
 
-class FolderPathRequest(BaseModel):
-    """文件夹路径解析请求模型"""
-    file_paths: List[str]  # 文件路径列表（相对路径或完整路径）
+    # 先写临时文件再原子重命名，并发请求不会读到半截文件
+    tmp_path = f"{thumb_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp_path, thumb_path)
+    return thumb_path
+
+
+# 缩略图接口支持的扩展名与MIME类型
+_IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.bmp': 'image/bmp',
+    '.gif': 'image/gif',
+}
 
 
 @app.get("/api/image")
-async def get_image(path: str = Query(..., description="图片文件的完整路径")):
+async def get_image(
+    request: Request,
+    path: str = Query(..., description="图片文件的完整路径"),
+    size: Optional[int] = Query(None, ge=16, le=1024, description="缩略图长边像素，不传则返回原图")
+):
     """
     获取本地图片文件（用于显示缩略图）
-    
+
+    带ETag/Cache-Control协商缓存：前端渲染几百张缩略图时，
+    未变化的图片命中304，不再重传图片内容。
+    传size参数时返回磁盘缓存的JPEG缩略图（长边≤size），
+    相机原图几MB的传输量缩到几KB。
+
     参数:
         path: 图片文件的完整路径（URL 编码）
-    
+        size: 可选，缩略图长边像素
+
     返回:
-        图片文件响应
+        图片文件响应（或 304 Not Modified）
     """
     try:
         # URL 解码路径
         import urllib.parse
         image_path = urllib.parse.unquote(path)
-        
-        # 检查文件是否存在
-        if not os.path.exists(image_path):
-            raise HTTPException(status_code=404, detail=f"图片文件不存在: {image_path}")
-        
-        # 检查是否是图片文件
-        image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-        if not any(image_path.lower().endswith(ext) for ext in image_extensions):
+
+        # 按真实扩展名确定MIME类型（顺带完成文件类型校验）
+        ext = os.path.splitext(image_path)[1].lower()
+        media_type = _IMAGE_MIME_TYPES.get(ext)
+        if media_type is None:
             raise HTTPException(status_code=400, detail="不支持的文件类型")
-        
-        # 返回图片文件
+
+        # 一次stat同时完成存在性检查和ETag计算（mtime+size标识内容版本）
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            raise HTTPException(status_code=404, detail=f"图片文件不存在: {image_path}")
+
+        # 缩略图与原图的ETag用size区分，互不串缓存
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}-{size or 0}"'
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304)
+
+        cache_headers = {'ETag': etag, 'Cache-Control': 'public, max-age=3600'}
+
+        if size:
+            # 生成/读取缩略图在线程池中进行，不阻塞事件循环
+            thumb_path = await asyncio.to_thread(
+                _get_or_create_thumbnail, image_path, size, st
+            )
+            return FileResponse(
+                thumb_path,
+                media_type='image/jpeg',
+                filename=os.path.basename(image_path),
+                headers=cache_headers
+            )
+
+        # 返回图片文件（stat_result复用上面的stat结果，
+        # FileResponse内部不再重复stat；Linux下走sendfile零拷贝发送）
         return FileResponse(
             image_path,
-            media_type='image/jpeg',  # 根据实际类型调整
-            filename=os.path.basename(image_path)
+            media_type=media_type,
+            filename=os.path.basename(image_path),
+            headers=cache_headers,
+            stat_result=st
         )
-        
+
     except HTTPException:
         raise
     except Exception as e:
@@ -404,11 +586,15 @@ async def parse_folder_path(request: FolderPathRequest):
         
         # 如果路径包含分隔符，提取文件夹部分
         if '/' in first_path or '\\' in first_path:
-            # 移除文件名，保留文件夹路径
-            folder_path = first_path.rsplit('/', 1)[0] if '/' in first_path else first_path.rsplit('\\', 1)[0]
-            
+            # 统一成正斜杠后交给PurePath：混用两种分隔符的Windows路径
+            # （网页上传里很常见）也能正确取到父目录，不再手工挑分隔符
+            parsed = PurePath(first_path.replace('\\', '/'))
+            folder_path = str(parsed.parent)
+
             # 检查是否是完整路径（Windows: 包含盘符，Unix: 以 / 开头）
-            is_absolute = (len(folder_path) >= 2 and folder_path[1] == ':') or folder_path.startswith('/')
+            is_absolute = parsed.is_absolute() or (
+                len(first_path) >= 2 and first_path[1] == ':'
+            )
             
             if is_absolute:
                 # 完整路径，直接返回
@@ -467,15 +653,9 @@ async def cluster_images(request: ClusterRequest):
         if not os.path.isdir(image_dir):
             raise HTTPException(status_code=400, detail=f"路径不是目录: {image_dir}")
         
-        # 获取所有图片文件
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-        image_paths = []
-        for ext in image_extensions:
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext)))
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext.upper())))
-        
-        image_paths = sorted(list(set(image_paths)))  # 去重并排序
-        
+        # 获取所有图片文件（单次scandir，免去多轮glob）
+        image_paths = _scan_image_files(image_dir, _CLUSTER_IMAGE_EXTS)
+
         if len(image_paths) == 0:
             raise HTTPException(status_code=400, detail=f"目录中未找到图片文件: {image_dir}")
         
@@ -485,51 +665,104 @@ async def cluster_images(request: ClusterRequest):
                 detail=f"图片数量({len(image_paths)})少于聚类数量({n_clusters})"
             )
         
-        # 提取所有图片的LAB值
-        lab_vectors = []
+        # 先查LAB提取缓存：用户对同一目录反复调整n_clusters是常见用法，
+        # mtime/size未变的图片直接复用上次的结果，重负载的OpenCV提取
+        # 只对缓存未命中的文件执行
+        path_stats = {}
+        for p in image_paths:
+            try:
+                st = os.stat(p)
+                path_stats[p] = (st.st_mtime, st.st_size)
+            except OSError:
+                path_stats[p] = None
+
+        lab_by_path = {}
+        cached_entries = await asyncio.to_thread(
+            get_cached_lab_values, image_paths, center_ratio
+        )
+        for p, entry in cached_entries.items():
+            st = path_stats.get(p)
+            if st and entry[0] == st[0] and entry[1] == st[1]:
+                lab_by_path[p] = entry[2:]
+
+        miss_paths = [p for p in image_paths if p not in lab_by_path]
+        if miss_paths:
+            # 并行提取缓存未命中的图片：每张图派发到进程池，gather汇总，
+            # 事件循环不被CPU工作阻塞（extract_lab_from_image来自utils.imgtool，
+            # 模块级函数可直接被子进程pickle引用）
+            loop = asyncio.get_running_loop()
+            executor = _get_extract_executor()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, extract_lab_from_image, p, center_ratio)
+                for p in miss_paths
+            ], return_exceptions=True)
+
+            new_entries = []
+            for img_path, result in zip(miss_paths, results):
+                if isinstance(result, BaseException):
+                    print(f"警告: 跳过图片 {img_path}: {result}")
+                    continue
+                lab = (float(result[0]), float(result[1]), float(result[2]))
+                lab_by_path[img_path] = lab
+                st = path_stats.get(img_path)
+                if st:
+                    new_entries.append((img_path, center_ratio, st[0], st[1], *lab))
+
+            # 新提取的结果批量写回缓存（线程池执行，不阻塞事件循环）
+            await asyncio.to_thread(upsert_lab_cache, new_entries)
+
+        # SoA布局：L/a/b三个通道各自连续存放，ΔE2000向量化核按通道
+        # 取列时是单位步长访问；float32比默认float64省一半内存
+        lab_soa = np.empty((3, len(image_paths)), dtype=np.float32)
         valid_paths = []
-        
         for img_path in image_paths:
-            try:
-                lab_vector = extract_lab_from_image(img_path, center_ratio=center_ratio)
-                lab_vectors.append(lab_vector)
-                valid_paths.append(img_path)
-            except Exception as e:
-                print(f"警告: 跳过图片 {img_path}: {e}")
-        
-        if len(lab_vectors) == 0:
+            lab = lab_by_path.get(img_path)
+            if lab is None:
+                continue
+            lab_soa[:, len(valid_paths)] = lab
+            valid_paths.append(img_path)
+
+        if len(valid_paths) == 0:
             raise HTTPException(status_code=400, detail="未能提取任何图片的LAB值")
+
+        lab_soa = lab_soa[:, :len(valid_paths)]
+        lab_vectors = lab_soa.T  # 聚类接口期望(N,3)，转置是零拷贝视图
         
-        lab_vectors = np.array(lab_vectors)
-        
-        # 执行聚类
-        clusters = cluster_images_by_color_de2000(
+        # 执行聚类（CPU密集的scipy/NumPy计算放到线程池，
+        # 大目录聚类的几秒钟里事件循环仍能响应其他请求）
+        clusters = await asyncio.to_thread(
+            cluster_images_by_color_de2000,
             lab_vectors=lab_vectors,
             image_paths=valid_paths,
             n_clusters=n_clusters,
             linkage='average'
         )
-        
+
         print(f"聚类完成，生成的类别ID: {list(clusters.keys())}")
-        
+
         # 计算类间距离
         inter_cluster_stats = calculate_inter_cluster_distance(clusters)
         
-        # 构建图片信息列表（包含类别ID）
-        images_info = []
+        # 构建图片信息列表（包含类别ID）：先摊平 索引->类别ID 映射，
+        # 再按原始路径顺序单遍组装，省去嵌套的类别内循环和逐项查找
+        cluster_of = np.full(len(valid_paths), -1, dtype=np.int32)
         for cluster_id, cluster_info in clusters.items():
-            for idx, img_path in enumerate(cluster_info['images']):
-                img_idx = cluster_info['indices'][idx]
-                images_info.append({
-                    "path": img_path,
-                    "filename": os.path.basename(img_path),
-                    "lab": {
-                        "L": float(lab_vectors[img_idx][0]),
-                        "a": float(lab_vectors[img_idx][1]),
-                        "b": float(lab_vectors[img_idx][2])
-                    },
-                    "cluster_id": cluster_id
-                })
+            cluster_of[cluster_info['indices']] = cluster_id
+
+        L_arr, a_arr, b_arr = lab_soa
+        images_info = [
+            {
+                "path": img_path,
+                "filename": os.path.basename(img_path),
+                "lab": {
+                    "L": float(L_arr[img_idx]),
+                    "a": float(a_arr[img_idx]),
+                    "b": float(b_arr[img_idx])
+                },
+                "cluster_id": int(cluster_of[img_idx])
+            }
+            for img_idx, img_path in enumerate(valid_paths)
+        ]
         
         # 构建响应
         response = {
@@ -590,12 +823,15 @@ async def save_cluster_result(request: SaveClusterRequest):
         inter_cluster_stats = payload.get("inter_cluster_stats", {})
         total_images = int(payload.get("total_images", 0))
 
-        record_id = insert_cluster_result(
+        # SQLite写入放到线程池：大payload的磁盘fsync可能耗几十毫秒，
+        # 不能让事件循环卡住其他并发请求
+        record_id = await asyncio.to_thread(
+            insert_cluster_result,
             image_dir=request.image_dir,
             n_clusters=request.n_clusters,
             total_images=total_images,
             inter_cluster_stats=inter_cluster_stats,
-            payload_json=json.dumps(payload, ensure_ascii=False),
+            payload=payload,
             task_name=request.task_name,
             task_id=request.task_id,
         )
@@ -672,20 +908,24 @@ async def save_detection_result(request: SaveDetectionRequest):
           "cluster_result_id": request.cluster_result_id,
       }
 
-      record_id = insert_detection_result(
-          image_dir=request.image_dir,
-          total_images=request.total,
-          classified=request.classified,
-          payload_json=json.dumps(payload, ensure_ascii=False),
-          task_name=request.task_name,
-          task_id=request.task_id,
-      )
-      
-      # 批量插入图片记录到 task_images 表
-      from utils.db import insert_task_images_batch, get_connection
-      if request.results:
-          with get_connection() as conn:
-              insert_task_images_batch(conn, record_id, 'detect', request.results)
+      # 全部SQLite写入打包成一个同步函数放到线程池：大批量检测结果
+      # 的插入和fsync可能耗上百毫秒，不能让事件循环卡住其他并发请求
+      def _save_to_db() -> int:
+          record_id = insert_detection_result(
+              image_dir=request.image_dir,
+              total_images=request.total,
+              classified=request.classified,
+              payload=payload,
+              task_name=request.task_name,
+              task_id=request.task_id,
+          )
+          # 批量插入图片记录到 task_images 表
+          if request.results:
+              with get_connection() as conn:
+                  insert_task_images_batch(conn, record_id, 'detect', request.results)
+          return record_id
+
+      record_id = await asyncio.to_thread(_save_to_db)
 
       return {
           "success": True,
@@ -704,13 +944,17 @@ async def save_detection_result(request: SaveDetectionRequest):
 
 
 @app.get("/api/saved-cluster-results")
-async def get_saved_cluster_results():
+async def get_saved_cluster_results(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
     """
-    获取所有已保存的聚类结果列表（仅元数据，不含详细结果）。
+    获取已保存的聚类结果列表（仅元数据，不含详细结果）。
+    可选limit/offset分页；不传时保持返回全部的旧行为。
     """
     try:
         from utils.db import get_all_cluster_results
-        results = get_all_cluster_results()
+        results = await asyncio.to_thread(get_all_cluster_results, limit, offset)
         return {
             "success": True,
             "data": results
@@ -723,13 +967,17 @@ async def get_saved_cluster_results():
 
 
 @app.get("/api/saved-detection-results")
-async def get_saved_detection_results():
+async def get_saved_detection_results(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
     """
-    获取所有已保存的检测结果列表（仅元数据，不含详细结果）。
+    获取已保存的检测结果列表（仅元数据，不含详细结果）。
+    可选limit/offset分页；不传时保持返回全部的旧行为。
     """
     try:
         from utils.db import get_all_detection_results
-        results = get_all_detection_results()
+        results = await asyncio.to_thread(get_all_detection_results, limit, offset)
         return {
             "success": True,
             "data": results
@@ -764,7 +1012,7 @@ async def get_result_detail(type: str, id: int):
         if payload_json:
             return {
                 "success": True,
-                "data": json.loads(payload_json)
+                "data": _json_loads(payload_json)
             }
         else:
              raise HTTPException(status_code=404, detail="未找到结果数据")
@@ -785,11 +1033,12 @@ async def get_task_images_api(
     page: int = 1, 
     pageSize: int = 20, 
     search: str = "",
-    clusterId: Optional[int] = Query(None, description="筛选分类ID，-1表示未归类")
+    clusterId: Optional[int] = Query(None, description="筛选分类ID，-1表示未归类"),
+    cursorId: Optional[int] = Query(None, description="键集分页游标（上一页nextCursor）；传入时忽略page")
 ):
     """
     分页获取任务的图片列表
-    
+
     参数:
         type: "cluster" 或 "detect"
         id: 数据库记录ID
@@ -797,6 +1046,7 @@ async def get_task_images_api(
         pageSize: 每页数量
         search: 文件名搜索关键词
         clusterId: 筛选分类ID
+        cursorId: 键集分页游标，深页翻页时避免OFFSET扫描
     """
     try:
         from utils.db import get_task_images
@@ -811,7 +1061,8 @@ async def get_task_images_api(
             page=page,
             page_size=pageSize,
             search=search,
-            cluster_id=clusterId
+            cluster_id=clusterId,
+            cursor_id=cursorId
         )
         
         return {
@@ -859,63 +1110,139 @@ async def delete_result(result_id: int, type: str = Query("cluster", description
         )
 
 
+def _prepare_cluster_arrays(clusters: dict):
+    """
+    把聚类结果字典整理成批量ΔE2000所需的数组形式（每次检测只做一次）
+
+    参数:
+        clusters: 聚类结果字典（键为类别ID字符串）
+
+    返回:
+        (cluster_ids, cluster_means, cluster_intra_max)：
+        类别ID的int列表、(K, 3) float32的类别中心LAB数组、
+        (K,) float32的类内最大ΔE2000数组；没有有效类别时返回空数组
+    """
+    cluster_ids = []
+    means = []
+    intra_max = []
+    for cluster_id_str, cluster_info in clusters.items():
+        lab_mean = cluster_info.get('lab_mean', [])
+        if len(lab_mean) != 3:
+            continue
+        cluster_ids.append(int(cluster_id_str))
+        means.append(lab_mean)
+        intra_max.append(float(cluster_info.get('de2000_intra_max', 0.0)))
+
+    cluster_means = np.asarray(means, dtype=np.float32).reshape(-1, 3)
+    cluster_intra_max = np.asarray(intra_max, dtype=np.float32)
+    return cluster_ids, cluster_means, cluster_intra_max
+
+
+# 检测提取使用的中心区域比例（与LAB缓存的ratio键保持一致）
+_DETECT_CENTER_RATIO = 0.4
+
+
+async def _load_detect_lab_cache(image_paths: List[str]):
+    """
+    stat全部文件并查询LAB提取缓存（检测与聚类共用同一张缓存表）
+
+    返回:
+        (path_stats, lab_by_path)：path -> (mtime, size)的字典和
+        缓存命中（mtime/size未变）的path -> (L, a, b)字典
+    """
+    path_stats = {}
+    for p in image_paths:
+        try:
+            st = os.stat(p)
+            path_stats[p] = (st.st_mtime, st.st_size)
+        except OSError:
+            path_stats[p] = None
+
+    lab_by_path = {}
+    cached = await asyncio.to_thread(
+        get_cached_lab_values, image_paths, _DETECT_CENTER_RATIO
+    )
+    for p, entry in cached.items():
+        st = path_stats.get(p)
+        if st and entry[0] == st[0] and entry[1] == st[1]:
+            lab_by_path[p] = entry[2:]
+    return path_stats, lab_by_path
+
+
+def _collect_new_cache_entries(results, path_stats, lab_by_path) -> list:
+    """从检测结果中收集需要写回LAB缓存的新条目"""
+    entries = []
+    for r in results:
+        p = r.get('path')
+        lab = r.get('lab')
+        if not p or lab is None or p in lab_by_path:
+            continue
+        st = path_stats.get(p)
+        if st:
+            entries.append((
+                p, _DETECT_CENTER_RATIO, st[0], st[1],
+                lab['L'], lab['a'], lab['b']
+            ))
+    return entries
+
+
 def process_single_image(
     image_path: str,
-    clusters: dict,
-    max_scale: float = 1.1
+    cluster_ids: list,
+    cluster_means: np.ndarray,
+    cluster_intra_max: np.ndarray,
+    max_scale: float = 1.1,
+    lab_cached: Optional[tuple] = None
 ) -> dict:
     """
     处理单张图片的检测逻辑
-    
+
     参数:
         image_path: 图片路径
-        clusters: 聚类结果字典
+        cluster_ids: 类别ID列表（与cluster_means逐行对应）
+        cluster_means: (K, 3) 类别中心LAB数组
+        cluster_intra_max: (K,) 类内最大ΔE2000数组
         max_scale: 类内最大距离的放大系数
-    
+        lab_cached: 命中LAB缓存时传入的(L, a, b)，跳过解码和提取
+
     返回:
         检测结果字典
     """
-    import time
-    from skimage.color import deltaE_ciede2000
-    from utils.imgtool import extract_lab_from_image
-    
     # 记录开始时间
     start_time = time.time()
-    
+
     try:
-        # 提取图片的 Lab 值
-        lab_new = extract_lab_from_image(image_path, center_ratio=0.4)
+        # 提取图片的 Lab 值（缓存命中时直接复用）
+        if lab_cached is not None:
+            lab_new = lab_cached
+        else:
+            lab_new = extract_lab_from_image(
+                image_path, center_ratio=_DETECT_CENTER_RATIO
+            )
         L_new, a_new, b_new = lab_new
-        
-        # 步骤1: 计算到所有类别中心的 ΔE2000
+
+        # 步骤1: 一次批量调用算出到所有类别中心的 ΔE2000，再取最小
+        # （逐类别调用时K次小数组调用的固定开销远超实际计算量）
         best_cluster_id = None
         best_distance = float('inf')
-        
-        for cluster_id_str, cluster_info in clusters.items():
-            cluster_id = int(cluster_id_str)
-            lab_mean = cluster_info.get('lab_mean', [])
-            
-            if len(lab_mean) != 3:
-                continue
-            
-            # 计算 ΔE2000 距离
-            lab_new_reshaped = np.array([L_new, a_new, b_new]).reshape(1, 1, 3)
-            lab_mean_reshaped = np.array(lab_mean).reshape(1, 1, 3)
-            distance = deltaE_ciede2000(lab_new_reshaped, lab_mean_reshaped)[0, 0]
-            
-            if distance < best_distance:
-                best_distance = distance
-                best_cluster_id = cluster_id
-        
+
+        if len(cluster_ids) > 0:
+            lab_tiled = np.broadcast_to(
+                np.asarray(lab_new, dtype=np.float32), cluster_means.shape
+            )
+            # 装了numba时走JIT标量循环（无临时数组），否则是NumPy向量化实现
+            distances = de2000_pairwise(lab_tiled, cluster_means)
+            best_idx = int(np.argmin(distances))
+            best_cluster_id = cluster_ids[best_idx]
+            best_distance = float(distances[best_idx])
+
         # 步骤2: 判断是否可信（基于类内最大距离阈值）
         matched_cluster_id = None
         status = '未归类'
-        
+
         if best_cluster_id is not None:
-            cluster_info = clusters.get(str(best_cluster_id), {})
-            de2000_intra_max = cluster_info.get('de2000_intra_max', 0.0)
-            threshold = de2000_intra_max * max_scale
-            
+            threshold = float(cluster_intra_max[best_idx]) * max_scale
+
             if best_distance <= threshold:
                 matched_cluster_id = best_cluster_id
                 status = '已归类'
@@ -969,9 +1296,6 @@ async def detect_images(request: DetectRequest):
     基于已有聚类结果，检测新图片目录中的图片，将每张图片归类到最相近的类别。
     """
     try:
-        from skimage.color import deltaE_ciede2000
-        from utils.imgtool import extract_lab_from_image
-        
         image_dir = request.image_dir.strip()
         cluster_result = request.cluster_result
         max_scale = request.max_scale
@@ -980,13 +1304,9 @@ async def detect_images(request: DetectRequest):
         if not os.path.exists(image_dir) or not os.path.isdir(image_dir):
             raise HTTPException(status_code=400, detail=f"目录不存在: {image_dir}")
         
-        # 获取所有图片文件
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.tif']
-        image_paths = []
-        for ext in image_extensions:
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext)))
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext.upper())))
-        
+        # 获取所有图片文件（单次scandir，免去多轮glob）
+        image_paths = _scan_image_files(image_dir, _DETECT_IMAGE_EXTS)
+
         if not image_paths:
             raise HTTPException(status_code=400, detail=f"目录中没有找到图片文件: {image_dir}")
         
@@ -994,14 +1314,33 @@ async def detect_images(request: DetectRequest):
         clusters = cluster_result.get('clusters', {})
         if not clusters:
             raise HTTPException(status_code=400, detail="聚类结果中没有类别数据")
-        
-        # 检测结果列表
-        detection_results = []
-        
-        # 依次处理每张图片
-        for image_path in sorted(image_paths):
-            result = process_single_image(image_path, clusters, max_scale)
-            detection_results.append(result)
+
+        # 类别中心/阈值整理成数组，整个检测批次只做一次
+        cluster_ids, cluster_means, cluster_intra_max = _prepare_cluster_arrays(clusters)
+
+        # 复用聚类时写入的LAB缓存：同一目录先聚类后检测是典型流程，
+        # mtime/size未变的图片跳过解码和提取
+        path_stats, lab_by_path = await _load_detect_lab_cache(image_paths)
+
+        # 所有图片提交到提取进程池并行检测（解码+LAB提取是主要开销，
+        # 且每张图片完全独立），gather保持与路径排序一致的结果顺序
+        loop = asyncio.get_running_loop()
+        executor = _get_extract_executor()
+        detection_results = await asyncio.gather(*[
+            loop.run_in_executor(
+                executor, process_single_image,
+                image_path, cluster_ids, cluster_means, cluster_intra_max,
+                max_scale, lab_by_path.get(image_path)
+            )
+            for image_path in image_paths
+        ])
+
+        # 新提取的LAB值批量写回缓存，供后续检测/聚类复用
+        new_entries = _collect_new_cache_entries(
+            detection_results, path_stats, lab_by_path
+        )
+        if new_entries:
+            await asyncio.to_thread(upsert_lab_cache, new_entries)
         
         return {
             "success": True,
@@ -1052,14 +1391,13 @@ async def websocket_detect_images(websocket: WebSocket):
             })
             await websocket.close()
             return
+
+        # 类别中心/阈值整理成数组，整个检测批次只做一次
+        cluster_ids, cluster_means, cluster_intra_max = _prepare_cluster_arrays(clusters)
         
-        # 获取所有图片文件
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.tif']
-        image_paths = []
-        for ext in image_extensions:
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext)))
-            image_paths.extend(glob.glob(os.path.join(image_dir, ext.upper())))
-        
+        # 获取所有图片文件（单次scandir已排序，免去多轮glob）
+        image_paths = _scan_image_files(image_dir, _DETECT_IMAGE_EXTS)
+
         if not image_paths:
             await websocket.send_json({
                 'type': 'error',
@@ -1067,8 +1405,7 @@ async def websocket_detect_images(websocket: WebSocket):
             })
             await websocket.close()
             return
-        
-        image_paths = sorted(image_paths)
+
         total = len(image_paths)
         
         # 发送开始信号
@@ -1077,49 +1414,110 @@ async def websocket_detect_images(websocket: WebSocket):
             'total': total
         })
         
-        # 依次处理每张图片
-        classified_count = 0
-        for idx, image_path in enumerate(image_paths):
-            # 检查是否收到取消信号（非阻塞）
-            try:
-                cancel_data = await asyncio.wait_for(
-                    websocket.receive(), timeout=0.01
-                )
-                if cancel_data.get('type') == 'websocket.receive':
-                    text_data = cancel_data.get('text', '')
-                    json_data = cancel_data.get('json')
-                    # 检查文本消息或 JSON 消息
-                    if (text_data == 'cancel') or (json_data and json_data.get('type') == 'cancel'):
-                        await websocket.send_json({
-                            'type': 'cancelled',
-                            'processed': idx,
-                            'total': total
-                        })
-                        break
-            except asyncio.TimeoutError:
-                pass  # 没有取消信号，继续处理
-            
-            # 处理单张图片
-            result = process_single_image(image_path, clusters, max_scale)
-            
-            # 统计归类数量
-            if result.get('matched_cluster_id') is not None:
-                classified_count += 1
-            
-            # 立即发送单张结果
+        # 复用聚类时写入的LAB缓存（与HTTP检测端点相同的策略）
+        path_stats, lab_by_path = await _load_detect_lab_cache(image_paths)
+
+        # 全部图片先提交进程池并行处理，再按原始顺序逐个取结果发送：
+        # 进度消息的顺序语义不变，但计算在所有核上同时进行
+        loop = asyncio.get_running_loop()
+        executor = _get_extract_executor()
+        pending_futures = [
+            loop.run_in_executor(
+                executor, process_single_image,
+                image_path, cluster_ids, cluster_means, cluster_intra_max,
+                max_scale, lab_by_path.get(image_path)
+            )
+            for image_path in image_paths
+        ]
+
+        # 后台任务持续读取客户端消息，收到取消（或断开）时置位事件；
+        # 主循环只查事件标志，不再每张图片都等10ms的receive超时
+        cancel_evt = asyncio.Event()
+
+        async def _watch_cancel():
+            while True:
+                message = await websocket.receive()
+                if message.get('type') == 'websocket.disconnect':
+                    cancel_evt.set()
+                    return
+                text_data = message.get('text', '')
+                if text_data == 'cancel':
+                    cancel_evt.set()
+                    return
+                try:
+                    if text_data and json.loads(text_data).get('type') == 'cancel':
+                        cancel_evt.set()
+                        return
+                except (ValueError, AttributeError):
+                    pass  # 非JSON消息，忽略
+
+        cancel_task = asyncio.create_task(_watch_cancel())
+
+        # 进度按批发送（每32张或至少每0.1秒刷一次）：万张级检测时
+        # 单帧一张的JSON序列化和socket写调用会成为主要开销
+        progress_buf = []
+        batch_start = 0
+        last_flush = time.monotonic()
+
+        async def _flush_progress(next_start: int):
+            nonlocal progress_buf, batch_start, last_flush
+            if progress_buf:
+                await websocket.send_json({
+                    'type': 'progress_batch',
+                    'start_index': batch_start,
+                    'total': total,
+                    'results': progress_buf
+                })
+                progress_buf = []
+            batch_start = next_start
+            last_flush = time.monotonic()
+
+        try:
+            classified_count = 0
+            processed_results = []
+            for idx, image_path in enumerate(image_paths):
+                # 检查是否收到取消信号
+                if cancel_evt.is_set():
+                    # 取消尚未开始的任务（已在运行的worker任务会自然结束）
+                    for future in pending_futures[idx:]:
+                        future.cancel()
+                    await _flush_progress(idx)
+                    await websocket.send_json({
+                        'type': 'cancelled',
+                        'processed': idx,
+                        'total': total
+                    })
+                    break
+
+                # 等待本张图片的并行结果
+                result = await pending_futures[idx]
+                processed_results.append(result)
+
+                # 统计归类数量
+                if result.get('matched_cluster_id') is not None:
+                    classified_count += 1
+
+                # 结果进缓冲，按批大小/时间阈值刷出
+                progress_buf.append(result)
+                if len(progress_buf) >= 32 or time.monotonic() - last_flush > 0.1:
+                    await _flush_progress(idx + 1)
+
+            # 新提取的LAB值批量写回缓存（取消时也保留已完成的部分）
+            new_entries = _collect_new_cache_entries(
+                processed_results, path_stats, lab_by_path
+            )
+            if new_entries:
+                await asyncio.to_thread(upsert_lab_cache, new_entries)
+
+            # 刷出残余进度并发送完成信号
+            await _flush_progress(total)
             await websocket.send_json({
-                'type': 'progress',
-                'index': idx,
+                'type': 'completed',
                 'total': total,
-                'result': result
+                'classified': classified_count
             })
-        
-        # 发送完成信号
-        await websocket.send_json({
-            'type': 'completed',
-            'total': total,
-            'classified': classified_count
-        })
+        finally:
+            cancel_task.cancel()
         
     except WebSocketDisconnect:
         # 客户端主动断开连接，清理资源
@@ -0,0 +1,126 @@
+"""
+纯NumPy实现的CIEDE2000（ΔE2000）色差计算
+skimage的deltaE_ciede2000对(1,1,3)小数组的单次调用开销极大，
+这里提供批量化版本，一次调用即可计算N对颜色的色差
+"""
+
+import numpy as np
+
+
+def deltaE2000_batch(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    批量计算两组LAB颜色之间的ΔE2000色差（CIEDE2000标准公式）
+
+    参数:
+        lab1: LAB向量数组，形状为 (N, 3) 或 (3,)
+        lab2: LAB向量数组，形状为 (N, 3) 或 (3,)，与lab1逐行配对
+
+    返回:
+        delta_e: 形状为 (N,) 的色差数组（float32）
+    """
+    lab1 = np.asarray(lab1, dtype=np.float32).reshape(-1, 3)
+    lab2 = np.asarray(lab2, dtype=np.float32).reshape(-1, 3)
+
+    L1, a1, b1 = lab1[:, 0], lab1[:, 1], lab1[:, 2]
+    L2, a2, b2 = lab2[:, 0], lab2[:, 1], lab2[:, 2]
+
+    # 1. 计算 C'（色度）和 h'（色相角），带G补偿
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    C_bar = 0.5 * (C1 + C2)
+    C_bar7 = C_bar ** 7
+    G = 0.5 * (1.0 - np.sqrt(C_bar7 / (C_bar7 + 25.0 ** 7)))
+
+    a1p = (1.0 + G) * a1
+    a2p = (1.0 + G) * a2
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360.0
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360.0
+
+    # 2. 计算 ΔL'、ΔC'、ΔH'
+    dLp = L2 - L1
+    dCp = C2p - C1p
+
+    h_diff = h2p - h1p
+    dhp = np.where(h_diff > 180.0, h_diff - 360.0,
+                   np.where(h_diff < -180.0, h_diff + 360.0, h_diff))
+    # 任一颜色无色度时，色相差无意义
+    dhp = np.where(C1p * C2p == 0.0, 0.0, dhp)
+    dHp = 2.0 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp) * 0.5)
+
+    # 3. 计算加权函数 SL、SC、SH 和旋转项 RT
+    L_bar = 0.5 * (L1 + L2)
+    C_barp = 0.5 * (C1p + C2p)
+
+    h_sum = h1p + h2p
+    h_abs_diff = np.abs(h1p - h2p)
+    h_barp = np.where(
+        C1p * C2p == 0.0,
+        h_sum,
+        np.where(
+            h_abs_diff <= 180.0,
+            0.5 * h_sum,
+            np.where(h_sum < 360.0, 0.5 * (h_sum + 360.0), 0.5 * (h_sum - 360.0))
+        )
+    )
+
+    T = (1.0
+         - 0.17 * np.cos(np.radians(h_barp - 30.0))
+         + 0.24 * np.cos(np.radians(2.0 * h_barp))
+         + 0.32 * np.cos(np.radians(3.0 * h_barp + 6.0))
+         - 0.20 * np.cos(np.radians(4.0 * h_barp - 63.0)))
+
+    L_bar_minus50_sq = (L_bar - 50.0) ** 2
+    SL = 1.0 + 0.015 * L_bar_minus50_sq / np.sqrt(20.0 + L_bar_minus50_sq)
+    SC = 1.0 + 0.045 * C_barp
+    SH = 1.0 + 0.015 * C_barp * T
+
+    d_theta = 30.0 * np.exp(-(((h_barp - 275.0) / 25.0) ** 2))
+    C_barp7 = C_barp ** 7
+    RC = 2.0 * np.sqrt(C_barp7 / (C_barp7 + 25.0 ** 7))
+    RT = -np.sin(np.radians(2.0 * d_theta)) * RC
+
+    # 4. 合成最终色差
+    term_L = dLp / SL
+    term_C = dCp / SC
+    term_H = dHp / SH
+
+    delta_e = np.sqrt(
+        term_L ** 2 + term_C ** 2 + term_H ** 2 + RT * term_C * term_H
+    )
+    return delta_e
+
+
+def deltaE2000_single(lab1: np.ndarray, lab2: np.ndarray) -> float:
+    """计算单对LAB颜色的ΔE2000色差（标量便捷封装）"""
+    return float(deltaE2000_batch(lab1, lab2)[0])
+
+
+def deltaE76_batch(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """批量计算ΔE76色差（LAB空间欧氏距离）"""
+    lab1 = np.asarray(lab1, dtype=np.float32).reshape(-1, 3)
+    lab2 = np.asarray(lab2, dtype=np.float32).reshape(-1, 3)
+    return np.linalg.norm(lab1 - lab2, axis=-1)
+
+
+def deltaE94_batch(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    批量计算ΔE94色差（图形艺术参数 kL=1, K1=0.045, K2=0.015）
+    """
+    lab1 = np.asarray(lab1, dtype=np.float32).reshape(-1, 3)
+    lab2 = np.asarray(lab2, dtype=np.float32).reshape(-1, 3)
+
+    dL = lab1[:, 0] - lab2[:, 0]
+    C1 = np.hypot(lab1[:, 1], lab1[:, 2])
+    C2 = np.hypot(lab2[:, 1], lab2[:, 2])
+    dC = C1 - C2
+    da = lab1[:, 1] - lab2[:, 1]
+    db = lab1[:, 2] - lab2[:, 2]
+    # ΔH² = Δa² + Δb² - ΔC²（数值误差可能略负，截断到0）
+    dH_sq = np.maximum(da ** 2 + db ** 2 - dC ** 2, 0.0)
+
+    SC = 1.0 + 0.045 * C1
+    SH = 1.0 + 0.015 * C1
+    return np.sqrt(dL ** 2 + (dC / SC) ** 2 + dH_sq / SH ** 2)
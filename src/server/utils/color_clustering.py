@@ -5,11 +5,19 @@
 
 import numpy as np
 from typing import List, Dict, Tuple, Optional
-from sklearn.cluster import AgglomerativeClustering
-from scipy.spatial.distance import squareform, pdist
-from skimage.color import deltaE_ciede2000
+from scipy.cluster.hierarchy import linkage as scipy_linkage, fcluster
+from utils.ciede2000 import deltaE2000_batch
+from utils.deltae_numba import de2000_pairwise
 from utils.decorator import timer
 
+# fastcluster可选：与scipy同语义的C++最近邻链层次聚类实现，
+# 大样本（数千张图）时linkage步骤快数倍；没装则退回scipy
+try:
+    from fastcluster import linkage as fast_linkage
+    _HAS_FASTCLUSTER = True
+except ImportError:
+    _HAS_FASTCLUSTER = False
+
 
 @timer
 def compute_de2000_distance_matrix(lab_vectors: np.ndarray) -> np.ndarray:
@@ -23,27 +31,15 @@ def compute_de2000_distance_matrix(lab_vectors: np.ndarray) -> np.ndarray:
         distance_matrix: 距离矩阵，形状为 (n_samples, n_samples)
     """
     n_samples = lab_vectors.shape[0]
-    
-    # 计算所有样本对之间的距离
-    # 使用pdist计算上三角矩阵，然后转换为完整的距离矩阵
-    lab_reshaped = lab_vectors.reshape(n_samples, 1, 3)
-    
-    # 计算距离矩阵（ΔE2000）
-    distances = []
-    for i in range(n_samples):
-        row_distances = []
-        for j in range(n_samples):
-            if i == j:
-                row_distances.append(0.0)
-            else:
-                # ΔE2000计算需要(1,1,3)的形状
-                lab1 = lab_vectors[i].reshape(1, 1, 3)
-                lab2 = lab_vectors[j].reshape(1, 1, 3)
-                de = deltaE_ciede2000(lab1, lab2)[0, 0]
-                row_distances.append(de)
-        distances.append(row_distances)
-    
-    distance_matrix = np.array(distances)
+
+    # 只计算上三角的样本对，一次批量调用算完所有距离
+    idx_i, idx_j = np.triu_indices(n_samples, k=1)
+    pair_distances = de2000_pairwise(lab_vectors[idx_i], lab_vectors[idx_j])
+
+    # 填充为对称的完整距离矩阵（对角线为0）
+    distance_matrix = np.zeros((n_samples, n_samples), dtype=np.float32)
+    distance_matrix[idx_i, idx_j] = pair_distances
+    distance_matrix[idx_j, idx_i] = pair_distances
     return distance_matrix
 
 
@@ -77,8 +73,11 @@ def cluster_images_by_color_de2000(
             }
         }
     """
+    # 统一成连续float32：服务端传入的是SoA转置视图，脚本调用可能是
+    # float64；距离内核与linkage都能用float32工作，内存带宽减半
+    lab_vectors = np.ascontiguousarray(lab_vectors, dtype=np.float32)
     n_samples = len(lab_vectors)
-    
+
     if n_samples < n_clusters:
         raise ValueError(f"图片数量({n_samples})少于聚类数量({n_clusters})")
     
@@ -98,74 +97,79 @@ def cluster_images_by_color_de2000(
             }
         return clusters
     
-    # 计算ΔE2000距离矩阵
-    print(f"计算ΔE2000距离矩阵... (样本数: {n_samples})")
-    distance_matrix = compute_de2000_distance_matrix(lab_vectors)
-    
-    # 使用层次聚类（Agglomerative Clustering）
+    # 使用层次聚类
     # 注意：'ward'链接不支持预计算距离矩阵，必须使用欧氏距离
     # 为了严格使用ΔE2000，我们使用'average'或'complete'链接
+    condensed = None
     if linkage == 'ward':
         print(f"警告: 'ward'链接不支持ΔE2000距离，将使用LAB欧氏距离（近似）")
-        clustering = AgglomerativeClustering(
-            n_clusters=n_clusters,
-            linkage='ward',
-            metric='euclidean'
-        )
-        clustering.fit(lab_vectors)
+        # 直接在(N, 3)观测矩阵上做ward linkage：scipy/fastcluster内部
+        # 按需计算欧氏距离，完全不构造N×N矩阵，也省去sklearn的
+        # 参数校验和方阵包装开销
+        if _HAS_FASTCLUSTER:
+            Z = fast_linkage(lab_vectors, method='ward')
+        else:
+            Z = scipy_linkage(lab_vectors, method='ward')
+        labels = fcluster(Z, t=n_clusters, criterion='maxclust') - 1
     else:
-        # 使用预计算的ΔE2000距离矩阵（推荐）
-        print(f"使用ΔE2000距离矩阵进行聚类 (linkage={linkage})")
-        clustering = AgglomerativeClustering(
-            n_clusters=n_clusters,
-            linkage=linkage,
-            metric='precomputed'
-        )
-        clustering.fit(distance_matrix)
-    
-    labels = clustering.labels_
+        # 预计算压缩形式（上三角）的ΔE2000距离，一次批量调用算完，
+        # 再交给scipy的C实现做层次聚类，避免逐步合并时重复计算距离
+        print(f"计算ΔE2000压缩距离向量... (样本数: {n_samples}, linkage={linkage})")
+        idx_i, idx_j = np.triu_indices(n_samples, k=1)
+        condensed = de2000_pairwise(lab_vectors[idx_i], lab_vectors[idx_j])
+
+        if _HAS_FASTCLUSTER:
+            # 压缩距离向量上的最近邻链聚合，语义与scipy一致
+            Z = fast_linkage(condensed, method=linkage)
+        else:
+            Z = scipy_linkage(condensed, method=linkage)
+        # fcluster返回从1开始的标签，对齐为从0开始
+        labels = fcluster(Z, t=n_clusters, criterion='maxclust') - 1
     
     # 统计每个类别的信息
     clusters = {}
     print(f"开始统计聚类信息 (n_clusters={n_clusters})")
     for cluster_id in range(n_clusters):
         cluster_indices = np.where(labels == cluster_id)[0]
+        if len(cluster_indices) == 0:
+            # maxclust切割偶尔会给出少于n_clusters个非空类别
+            continue
         cluster_lab_vectors = lab_vectors[cluster_indices]
-        
+
         # 类别ID从1开始索引
         display_cluster_id = cluster_id + 1
         print(f"  - 处理类别 {display_cluster_id} (内部索引 {cluster_id}), 样本数: {len(cluster_indices)}")
 
-        
-        # 计算平均LAB值
-        lab_mean = np.mean(cluster_lab_vectors, axis=0).tolist()
-        
-        # 计算LAB标准差
+        # 计算平均LAB值和标准差
+        lab_mean_arr = np.mean(cluster_lab_vectors, axis=0)
+        lab_mean = lab_mean_arr.tolist()
         lab_std = np.std(cluster_lab_vectors, axis=0).tolist()
-        
-        # 计算类内ΔE2000统计（每个样本与类别中心的距离）
-        cluster_lab_mean_reshaped = np.array(lab_mean).reshape(1, 1, 3)
-        de2000_distances = []
-        for lab_vec in cluster_lab_vectors:
-            lab_vec_reshaped = lab_vec.reshape(1, 1, 3)
-            de = deltaE_ciede2000(cluster_lab_mean_reshaped, lab_vec_reshaped)[0, 0]
-            de2000_distances.append(de)
-        
-        de2000_distances = np.array(de2000_distances)
-        
-        # 计算类内所有样本对之间的ΔE2000（更全面的误差度量）
+
+        # 类内ΔE2000统计（每个样本与类别中心的距离，一次批量调用）
+        center_tiled = np.broadcast_to(
+            lab_mean_arr.astype(np.float32), cluster_lab_vectors.shape
+        )
+        de2000_distances = deltaE2000_batch(center_tiled, cluster_lab_vectors)
+
+        # 类内所有样本对之间的ΔE2000
         if len(cluster_indices) > 1:
-            cluster_distances = []
-            for i in range(len(cluster_lab_vectors)):
-                for j in range(i + 1, len(cluster_lab_vectors)):
-                    lab1 = cluster_lab_vectors[i].reshape(1, 1, 3)
-                    lab2 = cluster_lab_vectors[j].reshape(1, 1, 3)
-                    de = deltaE_ciede2000(lab1, lab2)[0, 0]
-                    cluster_distances.append(de)
-            
-            de2000_mean_all_pairs = np.mean(cluster_distances) if cluster_distances else 0.0
-            de2000_max_all_pairs = np.max(cluster_distances) if cluster_distances else 0.0
-            de2000_std_all_pairs = np.std(cluster_distances) if cluster_distances else 0.0
+            pair_i, pair_j = np.triu_indices(len(cluster_indices), k=1)
+            if condensed is not None:
+                # linkage阶段已经算过全体样本对的距离，直接从压缩
+                # 距离向量按索引取出类内的对，零次重复ΔE2000计算
+                # （cluster_indices升序，gi<gj恒成立）
+                gi = cluster_indices[pair_i]
+                gj = cluster_indices[pair_j]
+                flat_idx = gi * n_samples - gi * (gi + 1) // 2 + (gj - gi - 1)
+                pair_distances = condensed[flat_idx]
+            else:
+                # ward分支没有压缩距离向量，按类内样本对批量计算
+                pair_distances = de2000_pairwise(
+                    cluster_lab_vectors[pair_i], cluster_lab_vectors[pair_j]
+                )
+            de2000_mean_all_pairs = float(np.mean(pair_distances))
+            de2000_max_all_pairs = float(np.max(pair_distances))
+            de2000_std_all_pairs = float(np.std(pair_distances))
         else:
             de2000_mean_all_pairs = 0.0
             de2000_max_all_pairs = 0.0
@@ -211,17 +215,10 @@ def calculate_inter_cluster_distance(clusters: Dict[int, Dict]) -> Dict[str, flo
             'std': 0.0
         }
     
-    inter_distances = []
-    for i in range(n_clusters):
-        for j in range(i + 1, n_clusters):
-            cluster_id_i = cluster_ids[i]
-            cluster_id_j = cluster_ids[j]
-            lab_mean_i = np.array(clusters[cluster_id_i]['lab_mean']).reshape(1, 1, 3)
-            lab_mean_j = np.array(clusters[cluster_id_j]['lab_mean']).reshape(1, 1, 3)
-            de = deltaE_ciede2000(lab_mean_i, lab_mean_j)[0, 0]
-            inter_distances.append(de)
-    
-    inter_distances = np.array(inter_distances)
+    # 批量计算所有类别中心对之间的ΔE2000（一次向量化调用）
+    lab_means = np.array([clusters[cid]['lab_mean'] for cid in cluster_ids])
+    idx_i, idx_j = np.triu_indices(n_clusters, k=1)
+    inter_distances = deltaE2000_batch(lab_means[idx_i], lab_means[idx_j])
     
     return {
         'mean': float(np.mean(inter_distances)),
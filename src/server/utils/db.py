@@ -1,16 +1,50 @@
+import functools
+import json
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, Optional
 
+# orjson可选：C级JSON编解码，逐行的lab_json序列化和payload解析
+# 受益明显；未安装时退回标准json，与主模块的处理方式一致
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 DB_FILENAME = "vision_sorter.db"
 
 
+def _utc_now_iso() -> str:
+    """当前UTC时间的ISO文本（秒精度，Z后缀）。
+
+    datetime.utcnow()已被弃用（naive结果易错），统一走时区感知的
+    now(timezone.utc)并用strftime一次格式化出入库格式。
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _json_dumps(obj) -> str:
+    """JSON序列化：优先orjson，退回标准json"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_loads(data):
+    """JSON反序列化：优先orjson，退回标准json"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=1)
 def get_db_path() -> str:
     """
-    获取 SQLite 数据库文件路径。
+    获取 SQLite 数据库文件路径（结果缓存，路径在进程生命周期内不变）。
     默认存放在后端 main.py 同级目录下，避免工作目录变化带来的路径问题。
     """
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,16 +53,38 @@ def get_db_path() -> str:
     return os.path.join(server_dir, DB_FILENAME)
 
 
+# 进程内复用的长连接：每次操作都重新connect要付打开文件、读schema、
+# 执行pragma的固定开销，小事务时这部分反而是大头。sqlite3连接对象
+# 本身非线程安全，持锁期间独占使用
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+
 @contextmanager
 def get_connection():
-    """获取 SQLite 连接的上下文管理器，自动提交和关闭。"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    try:
-        yield conn
-        conn.commit()
-    finally:
-        conn.close()
+    """获取进程内复用的 SQLite 连接（加锁独占），自动提交/回滚。"""
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            _conn = sqlite3.connect(get_db_path(), check_same_thread=False)
+            # WAL模式下读写互不阻塞（保存大结果时列表查询不再被锁），
+            # synchronous=NORMAL时提交只等WAL落盘，fsync次数大幅减少
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            # 临时表/排序缓冲放内存，数据文件用mmap读（256MB上限），
+            # 大payload行的读取走页缓存而不是read系统调用
+            _conn.execute("PRAGMA temp_store=MEMORY")
+            _conn.execute("PRAGMA mmap_size=268435456")
+            # 64MB页缓存（负值单位为KB）；busy_timeout兜底等锁而不是
+            # 立刻抛SQLITE_BUSY（极端情况下其他进程持有写锁时）
+            _conn.execute("PRAGMA cache_size=-65536")
+            _conn.execute("PRAGMA busy_timeout=60000")
+        try:
+            yield _conn
+            _conn.commit()
+        except Exception:
+            _conn.rollback()
+            raise
 
 
 def init_db() -> None:
@@ -127,68 +183,174 @@ def init_db() -> None:
         )
         # 创建索引以加速查询
         cur.execute("CREATE INDEX IF NOT EXISTS idx_task_images_task ON task_images(task_db_id, task_type)")
+        # 组合索引覆盖分页接口的可选过滤条件：按类别过滤和按文件名
+        # 前缀搜索都能在索引内定位，而不是在任务分区内逐行扫描
+        # （LIKE '%x%'这类中缀搜索无法利用索引，仍走分区扫描）
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_images_cluster "
+            "ON task_images(task_db_id, task_type, cluster_id)"
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_images_filename "
+            "ON task_images(task_db_id, task_type, filename COLLATE NOCASE)"
+        )
+
+        # 列表接口按created_at倒序展示，索引让其变成纯倒序扫描而非全表排序；
+        # task_id索引服务按前端任务查找的场景
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_cluster_created_at ON cluster_results(created_at DESC)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_detection_created_at ON detection_results(created_at DESC)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_cluster_task_id ON cluster_results(task_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_detection_task_id ON detection_results(task_id)")
+
+        # -----------------------------------------------------------
+        # LAB提取缓存表：按(path, ratio)记忆每张图片的LAB值，
+        # mtime/size用于判断文件是否已变化（变化则缓存失效）
+        # -----------------------------------------------------------
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_lab_cache (
+                path TEXT NOT NULL,
+                ratio REAL NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                l REAL NOT NULL,
+                a REAL NOT NULL,
+                b REAL NOT NULL,
+                PRIMARY KEY (path, ratio)
+            )
+            """
+        )
+
+
+# task_images按任务维度是"写入一次、之后只读"的：两次写入之间COUNT
+# 结果不会变，进程内按查询条件缓存，分页翻页不再每页都重跑COUNT扫描。
+# 读写都发生在get_connection的锁内，无需额外同步
+_count_cache: Dict[tuple, int] = {}
+_COUNT_CACHE_MAX = 256
+
+
+def _invalidate_count_cache(task_db_id: int, task_type: str) -> None:
+    """任务的图片记录发生增删时，清掉该任务的所有COUNT缓存条目。"""
+    stale = [k for k in _count_cache if k[0] == task_db_id and k[1] == task_type]
+    for key in stale:
+        del _count_cache[key]
+
+
+_INSERT_TASK_IMAGE_SQL = """
+    INSERT INTO task_images (
+        task_db_id, task_type, filename, path, cluster_id,
+        lab_json, distance, status, elapsed_time, created_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
 
 def insert_task_images_batch(conn, task_db_id: int, task_type: str, images: list[Dict[str, Any]]):
     """
     批量插入图片记录到 task_images 表
     """
-    created_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    
-    # 准备批量插入的数据
-    data_to_insert = []
-    import json
-    
-    for img in images:
-        # 通用字段
-        filename = img.get('filename', '')
-        path = img.get('path', '')
-        lab_data = img.get('lab', {})
-        lab_json = json.dumps(lab_data) if lab_data else None
-        
-        # 差异化字段
-        if task_type == 'cluster':
-            # 聚类任务的图片结构
-            cluster_id = img.get('cluster_id')
-            distance = None
-            status = None
-            elapsed_time = None
-        else:
-            # 检测任务的图片结构
-            cluster_id = img.get('matched_cluster_id')
-            distance = img.get('distance')
-            status = img.get('status')
-            elapsed_time = img.get('elapsed_time')
-            
-        data_to_insert.append((
-            task_db_id,
-            task_type,
-            filename,
-            path,
-            cluster_id,
-            lab_json,
-            distance,
-            status,
-            elapsed_time,
-            created_at
-        ))
-        
-    # 执行批量插入
-    # 分批执行，避免单条 SQL 过长
-    batch_size = 500
+    created_at = _utc_now_iso()
+
+    def _rows():
+        """逐行产出参数元组：executemany边取边绑定，
+        10万行时不再先物化一份完整的元组列表"""
+        for img in images:
+            # 通用字段
+            filename = img.get('filename', '')
+            path = img.get('path', '')
+            lab_data = img.get('lab', {})
+            lab_json = _json_dumps(lab_data) if lab_data else None
+
+            # 差异化字段
+            if task_type == 'cluster':
+                # 聚类任务的图片结构
+                cluster_id = img.get('cluster_id')
+                distance = None
+                status = None
+                elapsed_time = None
+            else:
+                # 检测任务的图片结构
+                cluster_id = img.get('matched_cluster_id')
+                distance = img.get('distance')
+                status = img.get('status')
+                elapsed_time = img.get('elapsed_time')
+
+            yield (
+                task_db_id,
+                task_type,
+                filename,
+                path,
+                cluster_id,
+                lab_json,
+                distance,
+                status,
+                elapsed_time,
+                created_at
+            )
+
+    # 单次executemany完成整批插入：参数按行绑定，不占单条SQL的宿主
+    # 参数上限，500行分片纯属多余；整批在调用方的事务里一次提交
     cur = conn.cursor()
-    
-    for i in range(0, len(data_to_insert), batch_size):
-        batch = data_to_insert[i : i + batch_size]
+    cur.executemany(_INSERT_TASK_IMAGE_SQL, _rows())
+    _invalidate_count_cache(task_db_id, task_type)
+
+
+def get_cached_lab_values(paths: Iterable[str], ratio: float) -> Dict[str, tuple]:
+    """
+    批量查询LAB提取缓存。
+
+    参数:
+        paths: 图片路径列表
+        ratio: 提取时使用的中心区域比例
+
+    返回:
+        path -> (mtime, size, L, a, b) 的字典（仅包含命中的路径）；
+        mtime/size由调用方与当前文件状态比对后决定是否采用
+    """
+    paths = list(paths)
+    hits: Dict[str, tuple] = {}
+    if not paths:
+        return hits
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # 分批查询，避免单条 SQL 的参数过多
+        batch_size = 500
+        for i in range(0, len(paths), batch_size):
+            batch = paths[i: i + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            cur.execute(
+                f"""
+                SELECT path, mtime, size, l, a, b
+                FROM image_lab_cache
+                WHERE ratio = ? AND path IN ({placeholders})
+                """,
+                [ratio, *batch],
+            )
+            for row in cur.fetchall():
+                hits[row[0]] = (row[1], row[2], row[3], row[4], row[5])
+    return hits
+
+
+def upsert_lab_cache(entries: Iterable[tuple]) -> None:
+    """
+    批量写入/更新LAB提取缓存。
+
+    参数:
+        entries: (path, ratio, mtime, size, L, a, b) 元组的可迭代对象
+    """
+    entries = list(entries)
+    if not entries:
+        return
+
+    with get_connection() as conn:
+        cur = conn.cursor()
         cur.executemany(
             """
-            INSERT INTO task_images (
-                task_db_id, task_type, filename, path, cluster_id, 
-                lab_json, distance, status, elapsed_time, created_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT OR REPLACE INTO image_lab_cache (path, ratio, mtime, size, l, a, b)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            batch
+            entries,
         )
 
 
@@ -197,53 +359,19 @@ def insert_cluster_result(
     n_clusters: int,
     total_images: int,
     inter_cluster_stats: Dict[str, Any],
-    payload_json: str,
+    payload: Dict[str, Any],
     task_name: str = "",
     task_id: str = "",
 ) -> int:
     """插入一条聚类结果记录，返回新纪录的 id。"""
-    created_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    
-    import json
-    # 解析 payload 以分离图片数据
-    try:
-        payload = json.loads(payload_json)
-        # 获取所有图片列表
-        images = payload.get('images', [])
-        
-        # 从 payload 中移除庞大的 images 列表，仅保留 cluster 统计信息
-        # 注意：前端某些组件可能依赖 clusters.{id}.images，如果那个也很大，也要移除
-        # 目前策略：移除根节点的 images 列表，保留 clusters 中的 images (如果是路径列表的话通常还好，但如果是几万张...)
-        # 为了稳妥，我们暂时只移除根节点的 images 列表，因为它最冗余。
-        # 如果 clusters 里的 images 列表也很大，建议也移除，前端详情页只展示统计。
-        
-        # 深度清理：
-        if 'images' in payload:
-            del payload['images']
-            
-        # 清理 clusters 中的 images 列表，防止 payload 依然过大
-        if 'clusters' in payload:
-            for cid in payload['clusters']:
-                if 'images' in payload['clusters'][cid]:
-                    # 将图片路径列表替换为数量，或者直接移除
-                    # 前端 ClusterTabs 可能用到这个... 
-                    # 如果前端 ClusterTabs 用它来展示 "分类详情 -> 图片列表"，那也需要改造成读接口。
-                    # 暂时保留 clusters 里的 images (仅路径)，假设它比完整 info 小很多。
-                    # 如果路径也很长，建议删除。
-                    # 让我们做得彻底一点：删除它。
-                    # 但是前端 ClusterTabs 依赖它。如果不改前端 ClusterTabs，这里删除会报错。
-                    # 我们将在后续步骤重构 ClusterTabs。现在先保留，或者只删除根 images。
-                    # 鉴于用户说有几万张，payload['clusters'][cid]['images'] 也会很大。
-                    # 我们先只删根 images，它是最大的冗余。
-                    pass
-
-        # 重新序列化 payload
-        optimized_payload_json = json.dumps(payload, ensure_ascii=False)
-        
-    except Exception as e:
-        print(f"Error optimizing payload: {e}")
-        optimized_payload_json = payload_json
-        images = []
+    created_at = _utc_now_iso()
+
+    # 直接在dict上分离庞大的images列表（存入task_images表做分页），
+    # 只序列化一次。此前接收已序列化的字符串再loads+dumps一轮，
+    # 大payload时解析和重建对象图的成本纯属浪费。
+    # clusters.{id}.images（仅路径列表）暂时保留，前端ClusterTabs依赖它
+    images = payload.pop('images', [])
+    optimized_payload_json = _json_dumps(payload)
 
     with get_connection() as conn:
         cur = conn.cursor()
@@ -291,28 +419,17 @@ def insert_detection_result(
     image_dir: str,
     total_images: int,
     classified: int,
-    payload_json: str,
+    payload: Dict[str, Any],
     task_name: str = "",
     task_id: str = "",
 ) -> int:
     """插入一条检测结果记录，返回新纪录的 id。"""
-    created_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    
-    import json
-    # 解析 payload 以分离图片数据
-    try:
-        payload = json.loads(payload_json)
-        results = payload.get('results', [])
-        
-        # 移除 results 列表
-        if 'results' in payload:
-            del payload['results']
-            
-        optimized_payload_json = json.dumps(payload, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error optimizing payload: {e}")
-        optimized_payload_json = payload_json
-        results = []
+    created_at = _utc_now_iso()
+
+    # 同insert_cluster_result：在dict上直接摘除results列表后单次
+    # 序列化，不再经历字符串→对象→字符串的往返
+    results = payload.pop('results', [])
+    optimized_payload_json = _json_dumps(payload)
 
     with get_connection() as conn:
         cur = conn.cursor()
@@ -348,22 +465,26 @@ def insert_detection_result(
         return record_id
 
 
-def get_all_cluster_results() -> list:
+def get_all_cluster_results(limit: Optional[int] = None, offset: int = 0) -> list:
     """
-    获取所有已保存的聚类结果列表（不包含 payload_json）。
-    用于列表展示，减少数据传输量。
+    获取已保存的聚类结果列表（不包含 payload_json）。
+    用于列表展示，减少数据传输量；传limit/offset时分页返回。
     """
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
+    query = """
             SELECT id, created_at, image_dir, n_clusters, total_images,
                    inter_cluster_mean, inter_cluster_min, inter_cluster_max, inter_cluster_std,
                    task_name, task_id
             FROM cluster_results
             ORDER BY created_at DESC
             """
-        )
+    params: list = []
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params = [limit, offset]
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
         rows = cur.fetchall()
         results = []
         for row in rows:
@@ -393,21 +514,25 @@ def get_cluster_result_payload(result_id: int) -> Optional[str]:
         return row[0] if row else None
 
 
-def get_all_detection_results() -> list:
+def get_all_detection_results(limit: Optional[int] = None, offset: int = 0) -> list:
     """
-    获取所有已保存的检测结果列表（不包含 payload_json）。
-    用于列表展示。
+    获取已保存的检测结果列表（不包含 payload_json）。
+    用于列表展示；传limit/offset时分页返回。
     """
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
+    query = """
             SELECT id, created_at, image_dir, total_images, classified,
                    task_name, task_id
             FROM detection_results
             ORDER BY created_at DESC
             """
-        )
+    params: list = []
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params = [limit, offset]
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
         rows = cur.fetchall()
         results = []
         for row in rows:
@@ -436,13 +561,18 @@ def get_detection_result_payload(result_id: int) -> Optional[str]:
 def get_task_images(
     task_db_id: int, 
     task_type: str, 
-    page: int = 1, 
+    page: int = 1,
     page_size: int = 20,
     search: str = "",
-    cluster_id: Optional[int] = None
+    cluster_id: Optional[int] = None,
+    cursor_id: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     分页获取任务关联的图片列表
+
+    传cursor_id（上一页最后一行的id）时走键集分页：OFFSET分页要
+    扫描并丢弃前面所有行（第500页丢掉近万行），键集分页直接在主键
+    上定位，任意页深都是O(page_size)。不传时保持页码分页兼容旧前端。
     """
     offset = (page - 1) * page_size
     
@@ -466,26 +596,42 @@ def get_task_images(
                 
         where_clause = " AND ".join(conditions)
         
-        # 查询总数
-        count_sql = f"SELECT COUNT(*) FROM task_images WHERE {where_clause}"
-        cur.execute(count_sql, params)
-        total_count = cur.fetchone()[0]
+        # 查询总数（进程内缓存命中时省去一次全分区索引扫描）
+        cache_key = (task_db_id, task_type, search, cluster_id)
+        total_count = _count_cache.get(cache_key)
+        if total_count is None:
+            count_sql = f"SELECT COUNT(*) FROM task_images WHERE {where_clause}"
+            cur.execute(count_sql, params)
+            total_count = cur.fetchone()[0]
+            if len(_count_cache) >= _COUNT_CACHE_MAX:
+                _count_cache.clear()
+            _count_cache[cache_key] = total_count
         
         # 查询分页数据
-        sql = f"""
-            SELECT id, filename, path, cluster_id, lab_json, distance, status, elapsed_time
-            FROM task_images 
-            WHERE {where_clause}
-            ORDER BY id ASC
-            LIMIT ? OFFSET ?
-        """
-        cur.execute(sql, params + [page_size, offset])
+        if cursor_id is not None:
+            # 键集分页：从上一页末尾的id继续，不扫描丢弃行
+            sql = f"""
+                SELECT id, filename, path, cluster_id, lab_json, distance, status, elapsed_time
+                FROM task_images
+                WHERE {where_clause} AND id > ?
+                ORDER BY id ASC
+                LIMIT ?
+            """
+            cur.execute(sql, params + [cursor_id, page_size])
+        else:
+            sql = f"""
+                SELECT id, filename, path, cluster_id, lab_json, distance, status, elapsed_time
+                FROM task_images
+                WHERE {where_clause}
+                ORDER BY id ASC
+                LIMIT ? OFFSET ?
+            """
+            cur.execute(sql, params + [page_size, offset])
         rows = cur.fetchall()
         
         items = []
-        import json
         for row in rows:
-            lab_data = json.loads(row[4]) if row[4] else None
+            lab_data = _json_loads(row[4]) if row[4] else None
             
             # 构造前端兼容的数据结构
             item = {
@@ -509,7 +655,9 @@ def get_task_images(
             "items": items,
             "total": total_count,
             "page": page,
-            "pageSize": page_size
+            "pageSize": page_size,
+            # 下一页的游标（本页最后一行的id）；无更多数据时为None
+            "nextCursor": rows[-1][0] if len(rows) == page_size else None
         }
 
 
@@ -522,6 +670,7 @@ def delete_cluster_result(result_id: int) -> bool:
         if success:
             # 级联删除图片记录
             cur.execute("DELETE FROM task_images WHERE task_db_id = ? AND task_type = 'cluster'", (result_id,))
+            _invalidate_count_cache(result_id, 'cluster')
         return success
 
 
@@ -534,6 +683,7 @@ def delete_detection_result(result_id: int) -> bool:
         if success:
             # 级联删除图片记录
             cur.execute("DELETE FROM task_images WHERE task_db_id = ? AND task_type = 'detect'", (result_id,))
+            _invalidate_count_cache(result_id, 'detect')
         return success
 
 
@@ -2,6 +2,7 @@
 函数执行耗时统计装饰器
 """
 
+import os
 import time
 import functools
 from typing import Callable, TypeVar, Any
@@ -9,21 +10,30 @@ from typing import Callable, TypeVar, Any
 # 类型变量，用于泛型函数
 F = TypeVar('F', bound=Callable[..., Any])
 
+# 仅在设置了 VISIONSORTER_PROFILE 环境变量时启用计时，
+# 生产/聚类热路径上装饰器完全退化为原函数（零开销）
+_PROFILE_ENABLED = bool(os.environ.get("VISIONSORTER_PROFILE"))
+
 
 def timer(func: F) -> F:
     """
     统计函数执行耗时的装饰器
     使用秒单位，保留4位小数，不显示函数参数
-    
+
+    默认是无操作的；设置环境变量 VISIONSORTER_PROFILE=1 后启用
+
     使用示例:
         @timer
         def my_function():
             pass
     """
+    if not _PROFILE_ENABLED:
+        return func
+
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
         start_time = float(time.perf_counter())
-        
+
         try:
             result = func(*args, **kwargs)
             return result
@@ -31,5 +41,5 @@ def timer(func: F) -> F:
             elapsed: float = time.perf_counter() - start_time
             func_name: str = func.__name__
             print(f"[TIMER] {func_name}: {elapsed:.4f} s")
-    
+
     return wrapper  # type: ignore
@@ -0,0 +1,117 @@
+"""
+Numba加速的CIEDE2000（ΔE2000）批量色差计算
+numba为可选依赖（未列入requirements.txt，打包环境可能不含），
+不可用时自动回退到utils.ciede2000中的纯NumPy实现
+"""
+
+import math
+
+import numpy as np
+
+from utils.ciede2000 import deltaE2000_batch
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+
+if _HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _de2000_pairwise_jit(labs_a, labs_b, out):  # pragma: no cover - 编译代码
+        """逐对计算ΔE2000，prange并行，循环体内只用标量math函数"""
+        pow25_7 = 25.0 ** 7
+        for i in prange(labs_a.shape[0]):
+            L1 = labs_a[i, 0]
+            a1 = labs_a[i, 1]
+            b1 = labs_a[i, 2]
+            L2 = labs_b[i, 0]
+            a2 = labs_b[i, 1]
+            b2 = labs_b[i, 2]
+
+            C1 = math.sqrt(a1 * a1 + b1 * b1)
+            C2 = math.sqrt(a2 * a2 + b2 * b2)
+            C_bar = 0.5 * (C1 + C2)
+            C_bar7 = C_bar ** 7
+            G = 0.5 * (1.0 - math.sqrt(C_bar7 / (C_bar7 + pow25_7)))
+
+            a1p = (1.0 + G) * a1
+            a2p = (1.0 + G) * a2
+            C1p = math.sqrt(a1p * a1p + b1 * b1)
+            C2p = math.sqrt(a2p * a2p + b2 * b2)
+
+            h1p = math.degrees(math.atan2(b1, a1p)) % 360.0
+            h2p = math.degrees(math.atan2(b2, a2p)) % 360.0
+
+            dLp = L2 - L1
+            dCp = C2p - C1p
+
+            if C1p * C2p == 0.0:
+                dhp = 0.0
+            else:
+                dhp = h2p - h1p
+                if dhp > 180.0:
+                    dhp -= 360.0
+                elif dhp < -180.0:
+                    dhp += 360.0
+            dHp = 2.0 * math.sqrt(C1p * C2p) * math.sin(math.radians(dhp) * 0.5)
+
+            L_bar = 0.5 * (L1 + L2)
+            C_barp = 0.5 * (C1p + C2p)
+
+            h_sum = h1p + h2p
+            if C1p * C2p == 0.0:
+                h_barp = h_sum
+            elif abs(h1p - h2p) <= 180.0:
+                h_barp = 0.5 * h_sum
+            elif h_sum < 360.0:
+                h_barp = 0.5 * (h_sum + 360.0)
+            else:
+                h_barp = 0.5 * (h_sum - 360.0)
+
+            T = (1.0
+                 - 0.17 * math.cos(math.radians(h_barp - 30.0))
+                 + 0.24 * math.cos(math.radians(2.0 * h_barp))
+                 + 0.32 * math.cos(math.radians(3.0 * h_barp + 6.0))
+                 - 0.20 * math.cos(math.radians(4.0 * h_barp - 63.0)))
+
+            L50sq = (L_bar - 50.0) ** 2
+            SL = 1.0 + 0.015 * L50sq / math.sqrt(20.0 + L50sq)
+            SC = 1.0 + 0.045 * C_barp
+            SH = 1.0 + 0.015 * C_barp * T
+
+            d_theta = 30.0 * math.exp(-(((h_barp - 275.0) / 25.0) ** 2))
+            C_barp7 = C_barp ** 7
+            RC = 2.0 * math.sqrt(C_barp7 / (C_barp7 + pow25_7))
+            RT = -math.sin(math.radians(2.0 * d_theta)) * RC
+
+            term_L = dLp / SL
+            term_C = dCp / SC
+            term_H = dHp / SH
+            out[i] = math.sqrt(
+                term_L * term_L + term_C * term_C + term_H * term_H
+                + RT * term_C * term_H
+            )
+
+
+def de2000_pairwise(labs_a: np.ndarray, labs_b: np.ndarray) -> np.ndarray:
+    """
+    批量计算逐对ΔE2000色差
+
+    参数:
+        labs_a: LAB向量数组，形状为 (N, 3)
+        labs_b: LAB向量数组，形状为 (N, 3)，与labs_a逐行配对
+
+    返回:
+        形状为 (N,) 的色差数组（float32）
+    """
+    if not _HAS_NUMBA:
+        return deltaE2000_batch(labs_a, labs_b)
+
+    labs_a = np.ascontiguousarray(labs_a, dtype=np.float32).reshape(-1, 3)
+    labs_b = np.ascontiguousarray(labs_b, dtype=np.float32).reshape(-1, 3)
+    out = np.empty(labs_a.shape[0], dtype=np.float32)
+    _de2000_pairwise_jit(labs_a, labs_b, out)
+    return out
@@ -2,12 +2,31 @@
 图片处理工具函数
 """
 
+import functools
+import os
+import threading
+
 import cv2
 import numpy as np
 from typing import Optional
-from skimage.color import rgb2lab
 from utils.decorator import timer
 
+# 批量提取时每个工作进程/线程复用的LAB转换目标缓冲，
+# 同尺寸图片连续处理时cvtColor不再每张都分配新输出
+_cvt_scratch = threading.local()
+
+
+def init_cv_worker() -> None:
+    """
+    进程池工作进程初始化：限制OpenCV/BLAS内部线程数为1
+
+    N个工作进程×每进程M个内部线程会产生N×M的过度订阅，
+    上下文切换反而让并行变慢；外层进程池已经占满物理核。
+    """
+    os.environ['OMP_NUM_THREADS'] = '1'
+    os.environ['OPENBLAS_NUM_THREADS'] = '1'
+    cv2.setNumThreads(1)
+
 
 @timer
 def detect_highlight_regions(
@@ -33,17 +52,25 @@ def detect_highlight_regions(
         mask = np.ones((h, w), dtype=np.uint8) * 255
     
     # 方法1: 基于LAB空间的亮度L值
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    lab_image = rgb2lab(rgb_image)
-    L_channel = lab_image[:, :, 0]
-    
+    # 直接BGR→8位LAB（查表+定点SIMD路径），省去BGR→RGB的整图拷贝和
+    # skimage的float64转换；阈值从CIE的0-100换算到uint8的0-255刻度
+    lab_image = cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
+    threshold_l_u8 = int(threshold_l * 255.0 / 100.0)
+    highlight_mask_l = cv2.inRange(
+        lab_image,
+        np.array([threshold_l_u8 + 1, 0, 0], dtype=np.uint8),
+        np.array([255, 255, 255], dtype=np.uint8)
+    )
+
     # 方法2: 基于HSV空间的饱和度和亮度（高光通常是高亮度+低饱和度）
     hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    
-    # 组合判断：L值很高 或 (亮度很高且饱和度很低)
-    highlight_mask_l = (L_channel > threshold_l).astype(np.uint8) * 255
-    highlight_mask_hsv = ((v > 240) & (s < threshold_saturation)).astype(np.uint8) * 255
+    # 单次inRange在交织的HSV缓冲上完成 V>240 且 S<threshold 的判断，
+    # 避免cv2.split分配三个通道平面
+    highlight_mask_hsv = cv2.inRange(
+        hsv,
+        np.array([0, 0, 241], dtype=np.uint8),
+        np.array([179, threshold_saturation - 1, 255], dtype=np.uint8)
+    )
     
     # 合并两种方法
     highlight_mask = cv2.bitwise_or(highlight_mask_l, highlight_mask_hsv)
@@ -54,6 +81,60 @@ def detect_highlight_regions(
     return highlight_mask
 
 
+@functools.lru_cache(maxsize=8)
+def center_circle_mask(h: int, w: int, ratio: float = 0.4) -> np.ndarray:
+    """
+    直接构建全图场景下的中心圆形mask（按(h, w, ratio)缓存）
+
+    等价于对全255矩形mask调用extract_center_region，但跳过矩量、
+    面积统计和两次全图位运算，只做一次zeros分配加一个圆形填充。
+    批量处理同尺寸图片时mask只构建一次。
+
+    参数:
+        h: 图像高度
+        w: 图像宽度
+        ratio: 中心区域半径比例，默认0.4（即40%）
+
+    返回:
+        center_mask: 中心区域的掩码（只读，缓存共享）
+    """
+    # 矩形mask的质心即几何中心，等效圆半径由面积直接算出
+    radius = int(np.sqrt(h * w / np.pi) * ratio)
+    center_mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.circle(center_mask, (w // 2, h // 2), radius, 255, -1)
+    # 缓存的mask被所有调用方共享，设为只读防止意外修改
+    center_mask.flags.writeable = False
+    return center_mask
+
+
+@functools.lru_cache(maxsize=8)
+def center_circle_roi(h: int, w: int, ratio: float = 0.4):
+    """
+    返回中心圆形区域的外接ROI边界和ROI内的圆形mask（按尺寸缓存）
+
+    与center_circle_mask是同一个圆，但调用方可以先裁剪ROI再做
+    颜色空间转换：ratio=0.4时圆的外接方块只占整图约两成像素，
+    cvtColor的工作量相应缩小，也不再需要全图大小的mask。
+
+    参数:
+        h: 图像高度
+        w: 图像宽度
+        ratio: 中心区域半径比例，默认0.4（即40%）
+
+    返回:
+        (y0, y1, x0, x1, mask_roi)：ROI边界（已按图像裁剪）和
+        ROI内的圆形掩码（只读，缓存共享）
+    """
+    radius = int(np.sqrt(h * w / np.pi) * ratio)
+    cy, cx = h // 2, w // 2
+    y0, y1 = max(0, cy - radius), min(h, cy + radius + 1)
+    x0, x1 = max(0, cx - radius), min(w, cx + radius + 1)
+    mask_roi = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    cv2.circle(mask_roi, (cx - x0, cy - y0), radius, 255, -1)
+    mask_roi.flags.writeable = False
+    return y0, y1, x0, x1, mask_roi
+
+
 @timer
 def extract_center_region(mask: np.ndarray, ratio: float = 0.4) -> np.ndarray:
     """
@@ -74,8 +155,8 @@ def extract_center_region(mask: np.ndarray, ratio: float = 0.4) -> np.ndarray:
     cx = int(M["m10"] / M["m00"])
     cy = int(M["m01"] / M["m00"])
     
-    # 计算等效圆半径
-    area = np.sum(mask > 0)
+    # 计算等效圆半径（countNonZero单次扫描，无布尔临时数组）
+    area = cv2.countNonZero(mask)
     radius = int(np.sqrt(area / np.pi) * ratio)
     
     # 创建圆形mask
@@ -86,22 +167,37 @@ def extract_center_region(mask: np.ndarray, ratio: float = 0.4) -> np.ndarray:
     return cv2.bitwise_and(mask, center_mask)
 
 
+def lab_uint8_to_cie(lab_vector: np.ndarray) -> np.ndarray:
+    """
+    将OpenCV 8位LAB的统计值还原到CIE范围
+
+    参数:
+        lab_vector: 8位LAB值，形状为 (3,) 或 (N, 3)
+
+    返回:
+        CIE范围的LAB值 (L: 0-100, a/b: -128到127)，float32
+    """
+    lab_vector = np.asarray(lab_vector, dtype=np.float32).copy()
+    lab_vector[..., 0] *= 100.0 / 255.0
+    lab_vector[..., 1:] -= 128.0
+    return lab_vector
+
+
 @timer
 def bgr_to_lab(image: np.ndarray) -> np.ndarray:
     """
     将BGR格式图像转换为LAB颜色空间
-    
+
     参数:
         image: BGR格式的OpenCV图像
-    
+
     返回:
-        lab_image: LAB颜色空间图像 (L: 0-100, a/b: -127到127)
+        lab_image: 8位LAB颜色空间图像 (L: 0-255缩放, a/b: 偏移128)
+            OpenCV的uint8 LAB走查表+定点SIMD路径，比skimage的
+            float64转换快一个数量级；统计缩减后用lab_uint8_to_cie
+            还原到CIE范围即可
     """
-    # 转换为RGB（OpenCV默认BGR，需要转RGB再转LAB）
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    # 转换为LAB颜色空间（使用skimage，它的LAB值范围正确）
-    lab_image = rgb2lab(rgb_image)
-    return lab_image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
 
 
 @timer
@@ -121,18 +217,37 @@ def extract_lab_from_mask(
     返回:
         lab_vector: [L, a, b] 三个值的numpy数组
     """
-    # 提取mask区域的LAB值
-    masked_lab = lab_image[mask > 0]
-    
-    if len(masked_lab) == 0:
-        return np.array([50.0, 0.0, 0.0])  # 默认中性灰
-    
-    # 计算LAB向量（中值或均值）
     if use_median:
-        lab_vector = np.median(masked_lab, axis=0)  # 抗高光干扰
+        if lab_image.dtype == np.uint8:
+            # 8位LAB走直方图中值：每通道256桶calcHist + 累计和查找，
+            # 单次O(N)扫描，无布尔索引拷贝也无排序
+            if cv2.countNonZero(mask) == 0:
+                return np.array([50.0, 0.0, 0.0], dtype=np.float32)  # 默认中性灰
+
+            lab_vector = np.empty(3, dtype=np.float32)
+            for channel in range(3):
+                hist = cv2.calcHist([lab_image], [channel], mask, [256], [0, 256]).ravel()
+                cdf = np.cumsum(hist)
+                lab_vector[channel] = np.searchsorted(cdf, cdf[-1] * 0.5)
+        else:
+            # 浮点LAB保留精确中值
+            masked_lab = lab_image[mask > 0]
+
+            if len(masked_lab) == 0:
+                return np.array([50.0, 0.0, 0.0], dtype=np.float32)  # 默认中性灰
+
+            lab_vector = np.median(masked_lab, axis=0)  # 抗高光干扰
     else:
-        lab_vector = np.mean(masked_lab, axis=0)
-    
+        if cv2.countNonZero(mask) == 0:
+            return np.array([50.0, 0.0, 0.0], dtype=np.float32)  # 默认中性灰
+
+        # cv2.mean在mask上单次扫描累加，省去布尔索引产生的拷贝
+        lab_vector = np.array(cv2.mean(lab_image, mask=mask)[:3], dtype=np.float32)
+
+    # 8位LAB只在缩减后的3个标量上还原到CIE范围，整图扫描保持uint8
+    if lab_image.dtype == np.uint8:
+        lab_vector = lab_uint8_to_cie(lab_vector)
+
     return lab_vector
 
 
@@ -153,23 +268,32 @@ def extract_lab_from_image(
     返回:
         lab_vector: [L, a, b] 三个值的numpy数组
     """
-    # 读取图像（BGR）
-    image = cv2.imread(image_path)
+    # 1/4分辨率解码（libjpeg在DCT域降采样，比全解码快约8倍）
+    # 反正只取中心区域的中值，降采样不影响统计结果
+    image = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_4)
+    if image is not None and min(image.shape[:2]) < 64:
+        # 缩得太狠时逐级回退，保证中心区域有足够像素做统计
+        image = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_2)
+        if image is not None and min(image.shape[:2]) < 64:
+            image = cv2.imread(image_path)
     if image is None:
         raise ValueError(f"无法读取图片: {image_path}")
-    
+
     h, w = image.shape[:2]
-    # 创建全图mask
-    mask = np.ones((h, w), dtype=np.uint8) * 255
-    
-    # 提取中心区域mask
-    center_mask = extract_center_region(mask, ratio=center_ratio)
-    
-    # 转换到LAB空间
-    lab_image = bgr_to_lab(image)
-    
+    # 先裁剪中心圆的外接ROI再转LAB：只有约两成像素参与cvtColor，
+    # 整图其余字节根本不碰；ROI边界和mask按尺寸缓存
+    y0, y1, x0, x1, mask_roi = center_circle_roi(h, w, center_ratio)
+    roi = image[y0:y1, x0:x1]
+
+    # dst=复用本worker的输出缓冲，批量同尺寸图片时零转换分配
+    buf = getattr(_cvt_scratch, 'buf', None)
+    if buf is None or buf.shape != roi.shape:
+        buf = np.empty(roi.shape, dtype=np.uint8)
+        _cvt_scratch.buf = buf
+    lab_image = cv2.cvtColor(roi, cv2.COLOR_BGR2Lab, dst=buf)
+
     # 根据mask提取LAB向量
-    lab_vector = extract_lab_from_mask(lab_image, center_mask, use_median=use_median)
-    
+    lab_vector = extract_lab_from_mask(lab_image, mask_roi, use_median=use_median)
+
     return lab_vector
 
@@ -94,6 +94,17 @@ export const useDetection = () => {
             if (onProgress) {
               onProgress(index, total, result);
             }
+          } else if (data.type === 'progress_batch') {
+            // 批量进度：后端按批发送（减少WS帧数），一帧含多张图片的结果
+            const batch: DetectionResult[] = data.results;
+            const startIndex: number = data.start_index;
+            const total: number = data.total;
+
+            resultsRef.current = [...resultsRef.current, ...batch];
+
+            if (onProgress) {
+              batch.forEach((result, i) => onProgress(startIndex + i, total, result));
+            }
           } else if (data.type === 'completed') {
             // 检测完成
             isFinishedRef.current = true;